@@ -1,22 +1,25 @@
+import bisect
 import calendar
 import datetime
 import logging
 import os
 import re
-import string
 import sys
 import textwrap
+from collections import defaultdict
+from functools import lru_cache
 from pathlib import Path
 from typing import (
+    Any,
+    DefaultDict,
+    Dict,
+    Iterator,
     List,
     Optional,
-    Set,
+    TYPE_CHECKING,
 )
 
 import click
-from github import GithubException
-from github.Issue import Issue
-from github.PullRequest import PullRequest
 from packaging.version import Version
 
 from .cli.options import (
@@ -25,8 +28,13 @@ from .cli.options import (
     galaxy_root_option,
     group_options,
 )
-from .github_client import github_client
+from .github_client import (
+    get_json_cached,
+    github_client,
+    graphql_query,
+)
 from .metadata import (
+    _graphql_node_to_pr,
     _pr_to_labels,
     _pr_to_str,
     _text_target,
@@ -34,17 +42,39 @@ from .metadata import (
     PROJECT_NAME,
     PROJECT_OWNER,
     PROJECT_URL,
+    SimplePR,
     strip_release,
 )
 from .util import verify_galaxy_root
 
+if TYPE_CHECKING:
+    from github.Repository import Repository
+
 OLDER_RELEASES_FILENAME = "older_releases.rst"
+ISSUE_REFERENCE_REGEX = re.compile(r"#(\d+)")
+ISSUE_LINK_REPLACEMENT = rf"`#\1 <{PROJECT_URL}/issues/\1>`__"
+PR_LINK_REGEX = re.compile(r"\.\. _Pull Request (\d+): https")
+RELEASE_NOTES_FILE_REGEX = re.compile(r"\d+\.\d+\.rst")
+FIRST_LINE_WRAPPER = textwrap.TextWrapper(initial_indent="* ", subsequent_indent="  ", width=160)
+REST_LINES_WRAPPER = textwrap.TextWrapper(initial_indent="  ", subsequent_indent="  ", width=160)
+# calendar.month_name formats a date on every lookup
+MONTH_NAMES = tuple(calendar.month_name)
+SEARCH_RESULTS_LIMIT = 1000
+# Grouped tag targets of the release notes, filled into TEMPLATE.
+ENHANCEMENT_TAG_TARGETS = "\n\n".join(f".. enhancement_tag_{value}" for value in GROUPED_TAGS.values())
+BUG_TAG_TARGETS = "\n\n".join(f".. bug_tag_{value}" for value in GROUPED_TAGS.values())
+# Targets of the user announcement file for PRs labeled with an area.
+USER_ANNOUNCE_AREA_TARGETS = {
+    "area/datatypes": "datatypes",
+    "area/visualizations": "visualizations",
+    "area/tools": "tools",
+}
 
 
 TEMPLATE = """
 .. to_doc
 
-${release}
+{release}
 ===============================
 
 .. announce_start
@@ -57,6 +87,8 @@ Enhancements
 
 .. feature
 
+{enhancement_targets}
+
 .. enhancement
 
 .. small_enhancement
@@ -69,17 +101,18 @@ Fixes
 .. major_bug
 
 
+{bug_targets}
+
 .. bug
 
 
-.. include:: ${release}_prs.rst
+.. include:: {release}_prs.rst
 
 """
 
-ANNOUNCE_TEMPLATE = string.Template(
-    """
+ANNOUNCE_TEMPLATE = """
 ===========================================================
-${release} Galaxy Release (${month_name} ${year})
+{release} Galaxy Release ({month_name} {year})
 ===========================================================
 
 .. include:: _header.rst
@@ -102,8 +135,8 @@ Feature3
 
 Feature description.
 
-Also check out the `${release} user release notes <${release}_announce_user.html>`__.
-Are you an admin? Check out `some admin relevant PRs <https://github.com/galaxyproject/galaxy/pulls?q=label%3Ahighlight%2Fadmin+milestone%3A${release}+is%3Aclosed+is%3Apr>`__.
+Also check out the `{release} user release notes <{release}_announce_user.html>`__.
+Are you an admin? Check out `some admin relevant PRs <https://github.com/galaxyproject/galaxy/pulls?q=label%3Ahighlight%2Fadmin+milestone%3A{release}+is%3Aclosed+is%3Apr>`__.
 
 Get Galaxy
 ===========================================================
@@ -113,12 +146,12 @@ The code lives at `GitHub <https://github.com/galaxyproject/galaxy>`__ and you s
 To get a new Galaxy repository run:
   .. code-block:: shell
 
-      $$ git clone -b release_${release} https://github.com/galaxyproject/galaxy.git
+      $ git clone -b release_{release} https://github.com/galaxyproject/galaxy.git
 
 To update an existing Galaxy repository run:
   .. code-block:: shell
 
-      $$ git fetch origin && git checkout release_${release} && git pull --ff-only origin release_${release}
+      $ git fetch origin && git checkout release_{release} && git pull --ff-only origin release_{release}
 
 See the `community hub <https://galaxyproject.org/develop/source-code/>`__ for additional details on source code locations.
 
@@ -138,17 +171,15 @@ Add content or drop section.
 Release Notes
 ===========================================================
 
-.. include:: ${release}.rst
+.. include:: {release}.rst
    :start-after: announce_start
 
 .. include:: _thanks.rst
 """  # noqa: E501
-)
 
-ANNOUNCE_USER_TEMPLATE = string.Template(
-    """
+ANNOUNCE_USER_TEMPLATE = """
 ===========================================================
-${release} Galaxy Release (${month_name} ${year})
+{release} Galaxy Release ({month_name} {year})
 ===========================================================
 
 .. include:: _header.rst
@@ -197,136 +228,175 @@ A special thanks to the release testing team for testing many of the new feature
 Release Notes
 ===========================================================
 
-Please see the :doc:`full release notes <${release}_announce>` for more details.
+Please see the :doc:`full release notes <{release}_announce>` for more details.
 
-.. include:: ${release}_prs.rst
+.. include:: {release}_prs.rst
 
 .. include:: _thanks.rst
 """  # noqa: E501
-)
 
-NEXT_TEMPLATE = string.Template(
-    """
+NEXT_TEMPLATE = """
 :orphan:
 
 ===========================================================
-${release} Galaxy Release
+{release} Galaxy Release
 ===========================================================
 """
-)
 
 PRS_TEMPLATE = """
 .. github_links
 """
 
-RELEASE_ISSUE_TEMPLATE = string.Template(
-    """
+MILESTONE_NUMBER_QUERY = """
+query($owner: String!, $name: String!, $title: String!) {
+  repository(owner: $owner, name: $name) {
+    milestones(query: $title, first: 100) {
+      nodes {
+        number
+        title
+      }
+    }
+  }
+}
+"""
 
-- [ ] **Branch Release (on or around ${freeze_date})**
+MILESTONE_PRS_QUERY = """
+query($owner: String!, $name: String!, $number: Int!, $states: [PullRequestState!], $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    milestone(number: $number) {
+      # Same order as the REST pulls listing used before, so entries land in the release files as they used to.
+      pullRequests(first: 100, after: $cursor, states: $states, orderBy: {field: UPDATED_AT, direction: DESC}) {
+        pageInfo {
+          endCursor
+          hasNextPage
+        }
+        nodes {
+          number
+          title
+          url
+          mergedAt
+          author {
+            login
+          }
+          labels(first: 100) {
+            nodes {
+              name
+            }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+RELEASE_ISSUE_TEMPLATE = """
+
+- [ ] **Branch Release (on or around {freeze_date})**
 
     - [ ] Verify that your installed version of `galaxy-release-util` is up-to-date.
-    - [ ] Ensure all [blocking milestone pull requests](https://github.com/galaxyproject/galaxy/pulls?q=is%3Aopen+is%3Apr+milestone%3A${version}) have been merged, closed, or postponed until the next release.
+    - [ ] Ensure all [blocking milestone pull requests](https://github.com/galaxyproject/galaxy/pulls?q=is%3Aopen+is%3Apr+milestone%3A{version}) have been merged, closed, or postponed until the next release.
 
-          galaxy-release-util check-blocking-prs ${version} --release-date ${release_date}
+          galaxy-release-util check-blocking-prs {version}
 
-    - [ ] Add latest database revision identifier (for ``release_${version}`` and ``${version}``) to ``REVISION_TAGS`` in ``galaxy/model/migrations/dbscript.py``.
+    - [ ] Add latest database revision identifier (for ``release_{version}`` and ``{version}``) to ``REVISION_TAGS`` in ``galaxy/model/migrations/dbscript.py``.
 
     - [ ] Merge the latest release into dev and push upstream.
 
-          make release-merge-stable-to-next RELEASE_PREVIOUS=release_${previous_version}
+          make release-merge-stable-to-next RELEASE_PREVIOUS=release_{previous_version}
           make release-push-dev
 
     - [ ] Create and push release branch:
 
           make release-create-rc
 
-    - [ ] Open pull requests from your fork of branch ``version-${version}`` to upstream ``release_${version}`` and of ``version-${next_version}.dev`` to ``dev``.
-    - [ ] [Create milestone](https://github.com/galaxyproject/galaxy/milestones) `${next_version}` for next release.
-    - [ ] Update ``MILESTONE_NUMBER`` in the [maintenance bot](https://github.com/galaxyproject/galaxy/blob/dev/.github/workflows/maintenance_bot.yaml) to reference `${next_version}` so it properly tags new pull requests.
+    - [ ] Open pull requests from your fork of branch ``version-{version}`` to upstream ``release_{version}`` and of ``version-{next_version}.dev`` to ``dev``.
+    - [ ] [Create milestone](https://github.com/galaxyproject/galaxy/milestones) `{next_version}` for next release.
+    - [ ] Update ``MILESTONE_NUMBER`` in the [maintenance bot](https://github.com/galaxyproject/galaxy/blob/dev/.github/workflows/maintenance_bot.yaml) to reference `{next_version}` so it properly tags new pull requests.
 
 - [ ] **Issue Review Timeline Notes**
 
-    - [ ] Ensure any security fixes will be ready prior to ${freeze_date} + 1 week, to allow time for notification prior to release.
+    - [ ] Ensure any security fixes will be ready prior to {freeze_date} + 1 week, to allow time for notification prior to release.
     - [ ] Ensure ownership of outstanding bugfixes and track progress during freeze.
 
 - [ ] **Deploy and Test Release on galaxy-test**
 
-    - [ ] Update test.galaxyproject.org to ensure it is running the ``release_${version}`` branch.
-    - [ ] Update testtoolshed.g2.bx.psu.edu to ensure it is running a dev at or past branch point (${freeze_date} + 1 day).
-    - [ ] Conduct formal release testing on test.galaxyproject.org (see ${version} release testing plan).
+    - [ ] Update test.galaxyproject.org to ensure it is running the ``release_{version}`` branch.
+    - [ ] Update testtoolshed.g2.bx.psu.edu to ensure it is running a dev at or past branch point ({freeze_date} + 1 day).
+    - [ ] Conduct formal release testing on test.galaxyproject.org (see {version} release testing plan).
     - [ ] Ensure all critical bugs detected during release testing have been fixed.
 
 
 - [ ] **Run tool and workflow tests:**
 
     - [ ] IUC:
-        - [ ] Open an issue "Test release ${version}" on the iuc repo: https://github.com/galaxyproject/tools-iuc/
-        - [ ] Post this comment to that issue: `/run-all-tool-tests branch=release_${version}`. This will trigger the "Weekly global Tool Linting and Tests" github workflow that lints and tests all IUC tools.
+        - [ ] Open an issue "Test release {version}" on the iuc repo: https://github.com/galaxyproject/tools-iuc/
+        - [ ] Post this comment to that issue: `/run-all-tool-tests branch=release_{version}`. This will trigger the "Weekly global Tool Linting and Tests" github workflow that lints and tests all IUC tools.
         - [ ] Wait for the workflow to complete, after which a brief summary will be automatically posted to the issue with a link to the workflow results.
-        - [ ] Examine workflow results, comparing them with the results of a [previous run of the same workflow](https://github.com/galaxyproject/tools-iuc/actions?query=workflow%3A%22Weekly+global+Tool+Linting+and+Tests%22) on the previous release (${previous_version}).
+        - [ ] Examine workflow results, comparing them with the results of a [previous run of the same workflow](https://github.com/galaxyproject/tools-iuc/actions?query=workflow%3A%22Weekly+global+Tool+Linting+and+Tests%22) on the previous release ({previous_version}).
               For each failed test:
-              - Does it occur under ${version} but not under ${previous_version}? If so:
+              - Does it occur under {version} but not under {previous_version}? If so:
                 - Check if there's an issue open. If not, open a new issue.
 
     - [ ] IWC:
-        - [ ] Open an issue "Test release ${version}" on the iwc repo: https://github.com/galaxyproject/iwc/
-        - [ ] Post this comment to that issue: `/run-all-workflow-tests branch=release_${version}`. This will trigger the "Weekly global Workflow Linting and Tests" github workflow that lints and tests all IWC workflows.
+        - [ ] Open an issue "Test release {version}" on the iwc repo: https://github.com/galaxyproject/iwc/
+        - [ ] Post this comment to that issue: `/run-all-workflow-tests branch=release_{version}`. This will trigger the "Weekly global Workflow Linting and Tests" github workflow that lints and tests all IWC workflows.
         - [ ] Wait for the workflow to complete, after which a brief summary will be automatically posted to the issue with a link to the workflow results.
-        - [ ] Examine workflow results, comparing them with the results of a [previous run of the same workflow](https://github.com/galaxyproject/iwc/actions?query=workflow%3A%22Weekly+global+Workflow+Linting+and+Tests%22) on the previous release (${previous_version}).
+        - [ ] Examine workflow results, comparing them with the results of a [previous run of the same workflow](https://github.com/galaxyproject/iwc/actions?query=workflow%3A%22Weekly+global+Workflow+Linting+and+Tests%22) on the previous release ({previous_version}).
               For each failed test:
-              - Does it occur under ${version} but not under ${previous_version}? If so:
+              - Does it occur under {version} but not under {previous_version}? If so:
                 - Check if there's an issue open. If not, open a new issue.
 
 - [ ] **Create Release Notes**
 
-    - [ ] Review pull requests merged since `release_${previous_version}`, ensure their titles are properly formatted and they all have a `${version}` or `${next_version}` milestone attached. [Link](https://github.com/galaxyproject/galaxy/pulls?utf8=%E2%9C%93&q=is%3Apr+is%3Amerged+no%3Amilestone+-label%3Amerge+)
+    - [ ] Review pull requests merged since `release_{previous_version}`, ensure their titles are properly formatted and they all have a `{version}` or `{next_version}` milestone attached. [Link](https://github.com/galaxyproject/galaxy/pulls?utf8=%E2%9C%93&q=is%3Apr+is%3Amerged+no%3Amilestone+-label%3Amerge+)
     - [ ] Switch to release branch and create a new branch for release notes
 
-          git checkout release_${version} -b ${version}_release_notes
+          git checkout release_{version} -b {version}_release_notes
     - [ ] Bootstrap the release notes
 
-          galaxy-release-util create-changelog ${version} --release-date ${release_date} --next-version ${next_version}
+          galaxy-release-util create-changelog {version} --release-date {release_date} --next-version {next_version}
     - [ ] Open newly created files and manually curate major topics and release notes.
-    - [ ] Run ``python scripts/release-diff.py release_${previous_version}`` and add configuration changes to release notes.
+    - [ ] Run ``python scripts/release-diff.py release_{previous_version}`` and add configuration changes to release notes.
     - [ ] Add new release to doc/source/releases/index.rst
     - [ ] Open a pull request for the release notes branch.
     - [ ] Merge release notes pull request.
 
 - [ ] **Deploy and Test Release on galaxy-main**
-    - [ ] Update usegalaxy.org to ensure it is running the ``release_${version}`` branch.
+    - [ ] Update usegalaxy.org to ensure it is running the ``release_{version}`` branch.
     - [ ] Deploy to toolshed.g2.bx.psu.edu.
     - [ ] Conduct second stage of release testing on usegalaxy.org.
-    - [ ] [Update BioBlend CI testing](https://github.com/galaxyproject/bioblend/blob/main/.github/workflows/test.yaml) to include a ``release_${version}`` target: add ``- release_${version}`` to the ``galaxy_version`` list in ``.github/workflows/test.yaml`` .
+    - [ ] [Update BioBlend CI testing](https://github.com/galaxyproject/bioblend/blob/main/.github/workflows/test.yaml) to include a ``release_{version}`` target: add ``- release_{version}`` to the ``galaxy_version`` list in ``.github/workflows/test.yaml`` .
     - [ ] Update GALAXY_RELEASE in IUC and devteam github workflows
         - [ ] https://github.com/galaxyproject/tools-iuc/blob/master/.github/workflows/
         - [ ] https://github.com/galaxyproject/tools-devteam/blob/master/.github/workflows/
 
 - [ ] **Do Release**
 
-    - [ ] Ensure all [blocking milestone issues](https://github.com/galaxyproject/galaxy/issues?q=is%3Aopen+is%3Aissue+milestone%3A${version}) have been resolved.
+    - [ ] Ensure all [blocking milestone issues](https://github.com/galaxyproject/galaxy/issues?q=is%3Aopen+is%3Aissue+milestone%3A{version}) have been resolved.
 
-          galaxy-release-util check-blocking-issues ${version}
-    - [ ] Ensure all [blocking milestone pull requests](https://github.com/galaxyproject/galaxy/pulls?q=is%3Aopen+is%3Apr+milestone%3A${version}) have been merged, closed, or postponed until the next release.
+          galaxy-release-util check-blocking-issues {version}
+    - [ ] Ensure all [blocking milestone pull requests](https://github.com/galaxyproject/galaxy/pulls?q=is%3Aopen+is%3Apr+milestone%3A{version}) have been merged, closed, or postponed until the next release.
 
-          galaxy-release-util check-blocking-prs ${version} --release-date ${release_date}
-    - [ ] Ensure all pull requests merged into the pre-release branch during the freeze have [milestones attached](https://github.com/galaxyproject/galaxy/pulls?q=is%3Apr+is%3Aclosed+base%3Arelease_${version}+is%3Amerged+no%3Amilestone)
-    - [ ] Ensure all pull requests merged into the pre-release branch during the freeze are the not [${next_version} milestones](https://github.com/galaxyproject/galaxy/pulls?q=is%3Apr+is%3Aclosed+base%3Arelease_${version}+is%3Amerged+milestone%3A${next_version})
-    - [ ] Ensure there are no blocking pull requests that target the `release_${version}` branch but [do not have the `${version}` milestone attached](https://github.com/galaxyproject/galaxy/pulls?q=is%3Apr+base%3Arelease_${version}+-label%3Akind%2Fbug+-milestone%3A${version}).
+          galaxy-release-util check-blocking-prs {version}
+    - [ ] Ensure all pull requests merged into the pre-release branch during the freeze have [milestones attached](https://github.com/galaxyproject/galaxy/pulls?q=is%3Apr+is%3Aclosed+base%3Arelease_{version}+is%3Amerged+no%3Amilestone)
+    - [ ] Ensure all pull requests merged into the pre-release branch during the freeze are the not [{next_version} milestones](https://github.com/galaxyproject/galaxy/pulls?q=is%3Apr+is%3Aclosed+base%3Arelease_{version}+is%3Amerged+milestone%3A{next_version})
+    - [ ] Ensure there are no blocking pull requests that target the `release_{version}` branch but [do not have the `{version}` milestone attached](https://github.com/galaxyproject/galaxy/pulls?q=is%3Apr+base%3Arelease_{version}+-label%3Akind%2Fbug+-milestone%3A{version}).
     - [ ] Ensure release notes include all pull requests added during the freeze by re-running the release note bootstrapping:
 
-          galaxy-release-util create-changelog ${version} --release-date ${release_date} --next-version ${next_version}
-    - [ ] Ensure previous release is merged into current. [GitHub branch comparison](https://github.com/galaxyproject/galaxy/compare/release_${version}...release_${previous_version})
+          galaxy-release-util create-changelog {version} --release-date {release_date} --next-version {next_version}
+    - [ ] Ensure previous release is merged into current. [GitHub branch comparison](https://github.com/galaxyproject/galaxy/compare/release_{version}...release_{previous_version})
     - [ ] Create and push release tag:
 
           make release-create
 
-    - [ ] Create the first point release (v${version}.0) using the instructions at https://docs.galaxyproject.org/en/master/dev/create_release.html#creating-galaxy-point-releases
+    - [ ] Create the first point release (v{version}.0) using the instructions at https://docs.galaxyproject.org/en/master/dev/create_release.html#creating-galaxy-point-releases
     - [ ] Open PR against planemo with a pin to the new packages
 
 - [ ] **Announce Release**
 
     - [ ] Verify release included in https://docs.galaxyproject.org/en/master/releases/index.html.
-    - [ ] Review announcement in https://github.com/galaxyproject/galaxy/blob/dev/doc/source/releases/${version}_announce.rst.
+    - [ ] Review announcement in https://github.com/galaxyproject/galaxy/blob/dev/doc/source/releases/{version}_announce.rst.
     - [ ] Announce release on [Galaxy Hub](https://galaxyproject.org/) as a news content item. [An example](https://galaxyproject.org/news/2024-02-07-galaxy-release-23-2/).
     - [ ] Post announcement to [Galaxy Help](https://help.galaxyproject.org/). [An example](https://help.galaxyproject.org/t/release-of-galaxy-23-2/11675).
     - [ ] Announce release on Galaxy's social media accounts ([Bluesky](https://bsky.app/profile/galaxyproject.bsky.social), [Mastodon](https://mstdn.science/@galaxyproject), [LinkedIn](https://linkedin.com/company/galaxy-project)).
@@ -335,10 +405,9 @@ RELEASE_ISSUE_TEMPLATE = string.Template(
 
 - [ ] **Complete release**
 
-    - [ ] Close milestone ``${version}`` and ensure milestone ``${next_version}`` exists.
+    - [ ] Close milestone ``{version}`` and ensure milestone ``{next_version}`` exists.
     - [ ] Close this issue.
 """  # noqa: E501
-)
 
 release_version_argument = click.argument("release-version", type=ClickVersion())
 
@@ -401,17 +470,17 @@ def create_release_issue(
         freeze_date=freeze_date,
         release_date=release_date,
     )
-    issue_contents = RELEASE_ISSUE_TEMPLATE.substitute(**issue_template_params)
+    issue_contents = RELEASE_ISSUE_TEMPLATE.format_map(issue_template_params)
     issue_title = f"Publication of Galaxy Release v {release_version}"
 
     if dry_run:
         print(issue_title)
         print(issue_contents)
         return None
+    from github import GithubException
+
     try:
-        github = github_client()
-        repo = github.get_repo(f"{PROJECT_OWNER}/{PROJECT_NAME}")
-        release_issue = repo.create_issue(
+        release_issue = _get_repo().create_issue(
             title=issue_title,
             body=issue_contents,
         )
@@ -428,26 +497,19 @@ def create_release_issue(
 def create_changelog(release_version: Version, next_version: Version, galaxy_root: Path, release_date: datetime.date):
 
     def create_release_file() -> None:
-        enhancement_targets = "\n\n".join(f".. enhancement_tag_{value}" for value in GROUPED_TAGS.values())
-        bug_targets = "\n\n".join(f".. bug_tag_{value}" for value in GROUPED_TAGS.values())
-
-        content = string.Template(TEMPLATE).substitute(release=release_version)
-        content = content.replace(".. enhancement", f"{enhancement_targets}\n\n.. enhancement")
-        content = content.replace(".. bug", f"{bug_targets}\n\n.. bug")
+        content = TEMPLATE.format(
+            release=release_version, enhancement_targets=ENHANCEMENT_TAG_TARGETS, bug_targets=BUG_TAG_TARGETS
+        )
         filename = _release_file(galaxy_root, f"{release_version}.rst")
         _write_file(filename, content, skip_if_exists=True)
 
     def create_announcement_file() -> None:
-        month = calendar.month_name[release_date.month]
-        year = release_date.year
-        content = ANNOUNCE_TEMPLATE.substitute(month_name=month, year=year, release=release_version)
+        content = ANNOUNCE_TEMPLATE.format(month_name=month, year=year, release=release_version)
         filename = _release_file(galaxy_root, f"{release_version}_announce.rst")
         _write_file(filename, content, skip_if_exists=False)
 
     def create_user_announcement_file() -> None:
-        month = calendar.month_name[release_date.month]
-        year = release_date.year
-        content = ANNOUNCE_USER_TEMPLATE.substitute(month_name=month, year=year, release=release_version)
+        content = ANNOUNCE_USER_TEMPLATE.format(month_name=month, year=year, release=release_version)
         filename = _release_file(galaxy_root, f"{release_version}_announce_user.rst")
         _write_file(filename, content, skip_if_exists=True)
 
@@ -455,25 +517,34 @@ def create_changelog(release_version: Version, next_version: Version, galaxy_roo
         _write_file(_get_prs_file(galaxy_root, release_version), PRS_TEMPLATE, skip_if_exists=True)
 
     def create_next_release_announcement_file() -> None:
-        content = NEXT_TEMPLATE.substitute(release=next_version)
+        content = NEXT_TEMPLATE.format(release=next_version)
         filename = _release_file(galaxy_root, f"{next_version}_announce.rst")
         _write_file(filename, content, skip_if_exists=True)
 
     verify_galaxy_root(galaxy_root)
     next_version = next_version or _get_next_release_version(release_version)
+    month = MONTH_NAMES[release_date.month]
+    year = release_date.year
     create_release_file()
     create_announcement_file()
     create_user_announcement_file()
     create_prs_file()
     create_next_release_announcement_file()
-    _load_prs(galaxy_root, release_version, release_date)
+    _load_prs(galaxy_root, release_version)
 
 
 @cli.command(help="List release blocking PRs")
-@group_options(release_version_argument, release_date_option)
-def check_blocking_prs(release_version: Version, release_date: datetime.date):
+@group_options(release_version_argument)
+@click.option(
+    "--release-date",
+    type=ClickDate(),
+    help="Deprecated and ignored, pull requests are selected by their milestone only.",
+)
+def check_blocking_prs(release_version: Version, release_date: Optional[datetime.date]):
+    if release_date is not None:
+        click.echo("Warning: --release-date is deprecated and ignored", err=True)
     block = 0
-    for pr in _get_prs(release_version, release_date, state="open"):
+    for pr in _get_prs(release_version, state="open"):
         click.echo(f"Blocking PR| {_pr_to_str(pr)}", err=True)
         block = 1
     sys.exit(block)
@@ -483,128 +554,169 @@ def check_blocking_prs(release_version: Version, release_date: datetime.date):
 @group_options(release_version_argument)
 def check_blocking_issues(release_version: Version):
     block = 0
-    github = github_client()
-    repo = github.get_repo(f"{PROJECT_OWNER}/{PROJECT_NAME}")
-    issues = repo.get_issues(state="open")
-    for issue in issues:
-        if (
-            issue.milestone
-            and issue.milestone.title == str(release_version)
-            and "Publication of Galaxy Release" not in issue.title
-            and not issue.pull_request
-        ):
+    # Let GitHub select the open issues of the milestone instead of paging through all open issues.
+    query = f'repo:{PROJECT_OWNER}/{PROJECT_NAME} is:issue is:open milestone:"{release_version}"'
+    for issue in _search_issues(query):
+        if "Publication of Galaxy Release" not in issue["title"]:
             click.echo(f"Blocking issue| {_issue_to_str(issue)}", err=True)
             block = 1
     sys.exit(block)
 
 
+def _search_issues(query: str) -> Iterator[Dict[str, Any]]:
+    page = 1
+    while True:
+        # Search results are revalidated with their ETag, so reruns are cheap.
+        data = get_json_cached("/search/issues", {"q": query, "per_page": 100, "page": page})
+        yield from data["items"]
+        # GitHub only serves the first SEARCH_RESULTS_LIMIT results of a search, asking for more pages fails.
+        if not data["items"] or page * 100 >= min(data["total_count"], SEARCH_RESULTS_LIMIT):
+            break
+        page += 1
+
+
+@lru_cache(maxsize=1)
+def _get_repo() -> "Repository":
+    return github_client().get_repo(f"{PROJECT_OWNER}/{PROJECT_NAME}")
+
+
 def _get_prs_file(galaxy_root: Path, release_version: Version) -> Path:
     return _release_file(galaxy_root, f"{release_version}_prs.rst")
 
 
-def _load_prs(galaxy_root: Path, release_version: Version, release_date: datetime.date) -> None:
-
-    def get_prs_from_prs_file() -> Set[int]:
-        with open(_get_prs_file(galaxy_root, release_version)) as fh:
-            return set(map(int, re.findall(r"\.\. _Pull Request (\d+): https", fh.read())))
+def _load_prs(galaxy_root: Path, release_version: Version) -> None:
+    # Each file is read and written once: lines for new PRs are collected per target
+    # and spliced into the contents in a single pass.
+    release_file = _release_file(galaxy_root, f"{release_version}.rst")
+    user_announce_file = _release_file(galaxy_root, f"{release_version}_announce_user.rst")
+    prs_file = _get_prs_file(galaxy_root, release_version)
+    release_insertions: DefaultDict[str, List[str]] = defaultdict(list)
+    user_announce_insertions: DefaultDict[str, List[str]] = defaultdict(list)
+    prs_insertions: DefaultDict[str, List[str]] = defaultdict(list)
 
-    seen_prs = get_prs_from_prs_file()
-    prs = _get_prs(release_version, release_date)
+    prs_content = _read_file(prs_file)
+    seen_prs = {int(match.group(1)) for match in PR_LINK_REGEX.finditer(prs_content)}
+    prs = _get_prs(release_version)
     n_prs = len(prs)
     for i, pr in enumerate(prs):
         if pr.number not in seen_prs:
             print(f"Processing PR {i + 1} of {n_prs}")
             _pr_to_doc(
-                galaxy_root=galaxy_root,
-                release_version=release_version,
                 pr=pr,
+                release_insertions=release_insertions,
+                user_announce_insertions=user_announce_insertions,
+                prs_insertions=prs_insertions,
             )
         else:
             print(f"Skipping PR {i + 1} of {n_prs} (previously processed)")
 
+    if release_insertions:
+        _write_file(release_file, _extend_targets(_read_file(release_file), release_insertions))
+    if user_announce_insertions:
+        _write_file(user_announce_file, _extend_targets(_read_file(user_announce_file), user_announce_insertions))
+    if prs_insertions:
+        _write_file(prs_file, _extend_targets(prs_content, prs_insertions))
 
-def _get_prs(release_version: Version, release_date: datetime.date, state: str = "closed") -> List[PullRequest]:
-    github = github_client()
-    repo = github.get_repo(f"{PROJECT_OWNER}/{PROJECT_NAME}")
 
-    # A pull request that was last updated before the previous release branch was created cannot be part of this release:
-    # the value of `updated_at` is updated on merge, so it had to be merged before the branch existed and, therefore, included in the previous release.
-    # Given that we can't reliably determine when the previous release branch was created, we subtract a year from
-    # the planned release date of the current release and use that as a cutoff date. For example, if the planned release date is August 1, 2025,
-    # we will not consider pull requests that were last updated before August 1, 2024. This is based on the assumption that
-    # there have to be at least two release branches created within a year: the previous release + the current release.
-    _cutoff_date = release_date.replace(year=release_date.year - 1)
-    cutoff_time = datetime.datetime.combine(_cutoff_date, datetime.time.min)
-
-    prs: List[PullRequest] = []
-    counter = 0
+def _get_prs(release_version: Version, state: str = "closed") -> List[SimplePR]:
     print("Collecting relevant pull requests...")
-    for pr in repo.get_pulls(state=state, sort="updated", direction="desc"):
-        assert pr.updated_at
-        if pr.updated_at.replace(tzinfo=None) < cutoff_time:
+    milestone_number = _get_milestone_number(release_version)
+    if milestone_number is None:
+        print(f"No milestone found for release {release_version}")
+        return []
+
+    # Only merged PRs are part of a release; open PRs are the ones blocking it.
+    pr_states = ["MERGED"] if state == "closed" else ["OPEN"]
+    prs: List[SimplePR] = []
+    cursor = None
+    while True:
+        data = graphql_query(
+            MILESTONE_PRS_QUERY,
+            {
+                "owner": PROJECT_OWNER,
+                "name": PROJECT_NAME,
+                "number": milestone_number,
+                "states": pr_states,
+                "cursor": cursor,
+            },
+        )
+        pull_requests = data["repository"]["milestone"]["pullRequests"]
+        prs.extend(_graphql_node_to_pr(node) for node in pull_requests["nodes"])
+        if not pull_requests["pageInfo"]["hasNextPage"]:
             break
-        counter += 1
-        if counter % 100 == 0:
-            print(
-                f"Examined {counter} PRs; collected {len(prs)} (currently on #{pr.number} updated on {pr.updated_at.date()})"
-            )
-        # Select PRs that are merged + have correct milestone + have not been previously collected and added to the prs file
-        proper_state = state != "closed" or pr.merged_at  # open PRs or PRs that have been merged
-        if proper_state and pr.milestone and pr.milestone.title == str(release_version):
-            prs.append(pr)
+        cursor = pull_requests["pageInfo"]["endCursor"]
 
     print(f"Collected {len(prs)} pull requests")
     return prs
 
 
-def _pr_to_doc(galaxy_root: Path, release_version: Version, pr: PullRequest) -> None:
-
-    def extend_target(target: str, line: str, source: str) -> str:
-        from_str = f".. {target}\n"
-        if target not in source:
-            raise Exception(f"Failed to find target [{target}] in source [{source}]")
-        return source.replace(from_str, f"{from_str}{line}\n")
-
-    def extend_prs_file_content(filename: Path) -> None:
-        content = _read_file(filename)
-        text = f".. _Pull Request {pr.number}: {PROJECT_URL}/pull/{pr.number}"
-        content = extend_target("github_links", text, content)
-        _write_file(filename, content)
-
-    def extend_release_file_content(filename: Path) -> None:
-        content = _read_file(filename)
-        text_target = _text_target(pr)
-        if text_target is not None:
-            content = extend_target(text_target, to_doc, content)
-        _write_file(filename, content)
-
-    def extend_user_announce_file_content(filename: Path) -> None:
-        content = _read_file(filename)
-        labels = _pr_to_labels(pr)
-        if "area/datatypes" in labels:
-            content = extend_target("datatypes", to_doc, content)
-        if "area/visualizations" in labels:
-            content = extend_target("visualizations", to_doc, content)
-        if "area/tools" in labels:
-            content = extend_target("tools", to_doc, content)
-        _write_file(filename, content)
+def _get_milestone_number(release_version: Version) -> Optional[int]:
+    """Return number of the milestone titled after the release version, if it exists."""
+    title = str(release_version)
+    data = graphql_query(MILESTONE_NUMBER_QUERY, {"owner": PROJECT_OWNER, "name": PROJECT_NAME, "title": title})
+    # The milestones query is a substring search, so "23.1" also matches "23.10".
+    for milestone in data["repository"]["milestones"]["nodes"]:
+        if milestone["title"] == title:
+            return milestone["number"]
+    return None
+
+
+def _pr_to_doc(
+    pr: SimplePR,
+    release_insertions: DefaultDict[str, List[str]],
+    user_announce_insertions: DefaultDict[str, List[str]],
+    prs_insertions: DefaultDict[str, List[str]],
+) -> None:
+    """Collect lines documenting pull request for the release, user announcement and PRs files by target."""
 
     def make_pr_to_doc() -> str:
-        to_doc = pr.title.rstrip(".") + " "
-        to_doc += f"\n(thanks to `@{pr.user.login} <https://github.com/{pr.user.login}>`__)."
-        to_doc += f"\n`Pull Request {pr.number}`_"
-        return wrap(to_doc)
+        parts = [
+            pr.title.rstrip("."),
+            f"(thanks to `@{pr.user_login} <https://github.com/{pr.user_login}>`__).",
+            f"`Pull Request {pr.number}`_",
+        ]
+        return wrap("\n".join(parts))
 
     to_doc = make_pr_to_doc()
 
-    filename = _release_file(galaxy_root, f"{release_version}.rst")
-    extend_release_file_content(filename)
+    labels = _pr_to_labels(pr)
+    text_target = _text_target(pr, labels=labels)
+    if text_target is not None:
+        release_insertions[text_target].append(to_doc)
 
-    filename = _release_file(galaxy_root, f"{release_version}_announce_user.rst")
-    extend_user_announce_file_content(filename)
+    for label in labels:
+        area_target = USER_ANNOUNCE_AREA_TARGETS.get(label)
+        if area_target is not None:
+            user_announce_insertions[area_target].append(to_doc)
 
-    filename = _release_file(galaxy_root, f"{release_version}_prs.rst")
-    extend_prs_file_content(filename)
+    prs_insertions["github_links"].append(f".. _Pull Request {pr.number}: {PROJECT_URL}/pull/{pr.number}")
+
+
+def _extend_targets(source: str, insertions: Dict[str, List[str]]) -> str:
+    """Insert lines right after the ``.. target`` comment of their target in source.
+
+    Lines are inserted in reverse order, the same as inserting each of them right after the target in turn.
+    All targets are spliced in a single scan of source.
+    """
+    if not insertions:
+        return source
+    pending = {f".. {target}\n": target for target in insertions}
+    # Longest anchors first, so that an anchor that is a prefix of another one cannot shadow it.
+    anchor_regex = re.compile("|".join(re.escape(anchor) for anchor in sorted(pending, key=len, reverse=True)))
+
+    def splice(match: "re.Match[str]") -> str:
+        anchor = match.group(0)
+        target = pending.pop(anchor, None)
+        if target is None:
+            # Only the first occurrence of an anchor is extended.
+            return anchor
+        return anchor + "".join(f"{line}\n" for line in reversed(insertions[target]))
+
+    result = anchor_regex.sub(splice, source)
+    if pending:
+        target = next(iter(pending.values()))
+        raise Exception(f"Failed to find target [{target}] in source [{source}]")
+    return result
 
 
 def _read_file(path: Path) -> str:
@@ -613,10 +725,14 @@ def _read_file(path: Path) -> str:
 
 
 def _write_file(path: Path, contents: str, skip_if_exists: bool = False) -> None:
-    if skip_if_exists and os.path.exists(path):
-        return
-    with open(path, "w") as f:
-        f.write(contents)
+    try:
+        with open(path, "x") as f:
+            f.write(contents)
+    except FileExistsError:
+        # Leave unchanged files alone, so that their modification time is preserved for Sphinx's incremental builds.
+        if not skip_if_exists and _read_file(path) != contents:
+            with open(path, "w") as f:
+                f.write(contents)
 
 
 def _get_next_release_version(version: Version) -> Version:
@@ -627,30 +743,36 @@ def _get_previous_release_version(galaxy_root: Path, version: Version) -> Option
     """Return previous release version if it exists."""
     # NOTE: We convert strings to Version objects to compare apples to apples:
     # str(Version(foo)) is not the same as the string foo: str(Version("22.05")) == "22.5"
-    prev = None
-    for release in _get_release_version_strings(galaxy_root):
-        release_version = Version(release)
-        if release_version >= version:
-            return prev
-        prev = release_version
-    return prev
+    releases = [Version(release) for release in _get_release_version_strings(galaxy_root)]
+    index = bisect.bisect_left(releases, version)
+    return releases[index - 1] if index > 0 else None
 
 
 def _get_release_version_strings(galaxy_root: Path) -> List[str]:
-    """Return sorted list of release version strings."""
+    """Return list of release version strings, sorted by version."""
     all_files = _get_release_documentation_filenames(galaxy_root)
-    release_notes_file_pattern = re.compile(r"\d+\.\d+.rst")
-    filenames = [f.rstrip(".rst") for f in all_files if release_notes_file_pattern.match(f)]
-    return sorted(filenames)
+    return sorted((Path(f).stem for f in all_files if RELEASE_NOTES_FILE_REGEX.fullmatch(f)), key=Version)
 
 
 def _get_release_documentation_filenames(galaxy_root: Path) -> List[str]:
-    """Return contents of release documentation directory."""
+    """Return sorted names of versioned ``.rst`` files in release documentation directory.
+
+    These are the release notes files, but also the announcement and PRs files of each release.
+    """
     releases_path = galaxy_root / "doc" / "source" / "releases"
-    if not os.path.exists(releases_path):
+    try:
+        entries = os.scandir(releases_path)
+    except FileNotFoundError:
         msg = f"Path to releases documentation not found: {releases_path}"
         raise Exception(msg)
-    return sorted(os.listdir(releases_path))
+    # The name check is coarser than RELEASE_NOTES_FILE_REGEX (it also matches announcement and PRs files),
+    # but skips other documentation files in the same single pass over the directory.
+    with entries:
+        return sorted(
+            entry.name
+            for entry in entries
+            if entry.name[:1].isdigit() and entry.name.endswith(".rst") and entry.is_file()
+        )
 
 
 def _release_file(galaxy_root: Path, filename: Optional[str]) -> Path:
@@ -662,25 +784,29 @@ def _release_file(galaxy_root: Path, filename: Optional[str]) -> Path:
 def _process_sentence(message: str) -> str:
     # Strip tags like [15.07].
     message = strip_release(message=message)
-    # Link issues and pull requests...
-    issue_url = f"https://github.com/{PROJECT_OWNER}/{PROJECT_NAME}/issues"
-    message = re.sub(r"#(\d+)", rf"`#\1 <{issue_url}/\1>`__", message)
+    # Link issues and pull requests, most titles reference none.
+    if "#" in message:
+        message = ISSUE_REFERENCE_REGEX.sub(ISSUE_LINK_REPLACEMENT, message)
     return message
 
 
 def wrap(message: str) -> str:
     message = _process_sentence(message)
-    wrapper = textwrap.TextWrapper(initial_indent="* ")
-    wrapper.subsequent_indent = "  "
-    wrapper.width = 160
     message_lines = message.splitlines()
-    first_lines = "\n".join(wrapper.wrap(message_lines[0]))
-    wrapper.initial_indent = "  "
-    rest_lines = "\n".join("\n".join(wrapper.wrap(m)) for m in message_lines[1:])
+    first_lines = "\n".join(_wrap_line(FIRST_LINE_WRAPPER, message_lines[0]))
+    rest_lines = "\n".join("\n".join(_wrap_line(REST_LINES_WRAPPER, m)) for m in message_lines[1:])
     return first_lines + ("\n" + rest_lines if rest_lines else "")
 
 
-def _issue_to_str(issue: Issue) -> str:
+def _wrap_line(wrapper: textwrap.TextWrapper, line: str) -> List[str]:
+    # A line that fits and has no whitespace to normalize would come back from the wrapper
+    # as is, minus trailing spaces: skip splitting it into chunks.
+    if line.isprintable() and len(wrapper.initial_indent) + len(line) <= wrapper.width and line.strip(" "):
+        return [wrapper.initial_indent + line.rstrip(" ")]
+    return wrapper.wrap(line)
+
+
+def _issue_to_str(issue: Dict[str, Any]) -> str:
     if isinstance(issue, str):
         return issue
-    return f"Issue #{issue.number} ({issue.title}) {issue.html_url}"
+    return f"Issue #{issue['number']} ({issue['title']}) {issue['html_url']}"
@@ -10,7 +10,10 @@ from click.core import (
     Context,
     Parameter,
 )
-from packaging.version import Version
+from packaging.version import (
+    InvalidVersion,
+    Version,
+)
 
 galaxy_root_option = click.option(
     "--galaxy-root",
@@ -35,7 +38,7 @@ class ClickVersion(click.ParamType):
     def convert(self, value: Any, param: Optional[Parameter], ctx: Optional[Context]) -> Version:
         try:
             return Version(value)
-        except ValueError as e:
+        except InvalidVersion as e:
             self.fail(f"{value!r} is not a valid PEP440 version number: {str(e)}", param, ctx)
 
 
@@ -1,9 +1,34 @@
+import importlib
+from typing import (
+    List,
+    Optional,
+)
+
 import click
 
-from ..bootstrap_history import cli as boostrap_cli
-from ..point_release import cli as point_release_cli
+# Module defining each subcommand on its ``cli`` group. Modules are imported only when one of their
+# commands is looked up, so running a command does not load the dependencies of the other modules.
+COMMAND_MODULES = {
+    "check-blocking-issues": "galaxy_release_util.bootstrap_history",
+    "check-blocking-prs": "galaxy_release_util.bootstrap_history",
+    "create-changelog": "galaxy_release_util.bootstrap_history",
+    "create-release-issue": "galaxy_release_util.bootstrap_history",
+    "build-and-upload": "galaxy_release_util.point_release",
+    "create-release": "galaxy_release_util.point_release",
+}
+
+
+class LazyCommandCollection(click.Group):
+    def list_commands(self, ctx: click.Context) -> List[str]:
+        return sorted(COMMAND_MODULES)
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> Optional[click.Command]:
+        module_name = COMMAND_MODULES.get(cmd_name)
+        if module_name is None:
+            return None
+        return importlib.import_module(module_name).cli.get_command(ctx, cmd_name)
+
 
-cli = click.CommandCollection(
-    sources=[boostrap_cli, point_release_cli],
+cli = LazyCommandCollection(
     help="Perform various tasks around creating Galaxy releases and point releases",
 )
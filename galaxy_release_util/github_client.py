@@ -1,10 +1,27 @@
+import hashlib
 import json
 import os
+import tempfile
+from functools import lru_cache
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    Optional,
+    TYPE_CHECKING,
+)
 
-from github import Github
+if TYPE_CHECKING:
+    from github import Github
 
+CACHE_DIRECTORY = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "galaxy-release-util"
+# Client settings, unless overridden in ~/.github.json: a pool of keep-alive connections shared by all
+# requests and GitHub's maximum page size for paginated REST listings (the default is 30).
+GITHUB_CLIENT_DEFAULTS: Dict[str, Any] = {"pool_size": 10, "per_page": 100}
 
-def github_client() -> Github:
+
+@lru_cache(maxsize=1)
+def github_client() -> "Github":
     """Search environment for github access token and produce client object.
 
     Easiest thing to do is just to set an environment variable GITHUB_AUTH to
@@ -13,13 +30,63 @@ def github_client() -> Github:
     ). Alternatively, this can be placed into a json file in ~/.github.json in a
     map keyed on login_or_token.
     """
+    # PyGithub is slow to import, only pay for it once GitHub is actually used.
+    from github import Github
+
     auth = os.environ.get("GITHUB_AUTH")
     if auth is not None:
-        return Github(auth)
+        return Github(auth, **GITHUB_CLIENT_DEFAULTS)
     else:
         github_json_path = os.path.expanduser("~/.github.json")
-        if not os.path.exists(github_json_path):
-            return Github(None)
-        with open(github_json_path) as fh:
-            github_json_dict = json.load(fh)
-        return Github(**github_json_dict)
+        try:
+            with open(github_json_path) as fh:
+                github_json_dict = json.load(fh)
+        except FileNotFoundError:
+            return Github(None, **GITHUB_CLIENT_DEFAULTS)
+        return Github(**{**GITHUB_CLIENT_DEFAULTS, **github_json_dict})
+
+
+def graphql_query(query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+    """Run a query against GitHub's GraphQL API and return the ``data`` member of the response.
+
+    Note that GitHub's GraphQL API cannot be used anonymously: an access token
+    has to be configured as described in ``github_client``.
+    """
+    requester = github_client()._Github__requester  # type: ignore[attr-defined]
+    _, response = requester.requestJsonAndCheck("POST", "/graphql", input={"query": query, "variables": variables})
+    if response.get("errors"):
+        raise Exception(f"GitHub GraphQL query failed: {response['errors']}")
+    return response["data"]
+
+
+def get_json_cached(url: str, parameters: Optional[Dict[str, Any]] = None) -> Any:
+    """GET a GitHub REST API resource, reusing the cached response if it has not changed.
+
+    Responses are stored with their ETag in CACHE_DIRECTORY. Revalidating them with
+    ``If-None-Match`` gets a ``304 Not Modified`` without a body from GitHub, which
+    does not count against the rate limit.
+    """
+    key = hashlib.sha1(json.dumps([url, parameters], sort_keys=True).encode()).hexdigest()
+    cache_path = CACHE_DIRECTORY / f"{key}.json"
+    cached = None
+    headers = {}
+    try:
+        with open(cache_path) as fh:
+            cached = json.load(fh)
+        headers["If-None-Match"] = cached["etag"]
+    except (OSError, ValueError, KeyError):
+        cached = None
+
+    requester = github_client()._Github__requester  # type: ignore[attr-defined]
+    response_headers, data = requester.requestJsonAndCheck("GET", url, parameters=parameters, headers=headers)
+    if cached is not None and data is None:
+        # 304 Not Modified
+        return cached["data"]
+
+    etag = response_headers.get("etag")
+    if etag:
+        CACHE_DIRECTORY.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=CACHE_DIRECTORY, delete=False) as tmp:
+            json.dump({"etag": etag, "data": data}, tmp)
+        os.replace(tmp.name, cache_path)
+    return data
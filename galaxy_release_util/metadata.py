@@ -1,24 +1,68 @@
+import datetime
 import re
-from typing import List
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+    TYPE_CHECKING,
+    Union,
+)
 
-from github.PullRequest import PullRequest
+if TYPE_CHECKING:
+    from github.PullRequest import PullRequest
 
 PROJECT_OWNER = "galaxyproject"
 PROJECT_NAME = "galaxy"
 PROJECT_URL = f"https://github.com/{PROJECT_OWNER}/{PROJECT_NAME}"
 PROJECT_API = f"https://api.github.com/repos/{PROJECT_OWNER}/{PROJECT_NAME}/"
+# Release tag prefixing a title, like [23.0]
+RELEASE_TAG_REGEX = re.compile(r"\s*\[[\w,\.,-]*\]\s*")
 
-GROUPED_TAGS = dict(
-    [
-        ("area/visualizations", "viz"),
-        ("area/datatypes", "datatypes"),
-        ("area/tools", "tools"),
-        ("area/workflows", "workflows"),
-        ("area/client", "ui"),
-        ("area/jobs", "jobs"),
-        ("area/admin", "admin"),
-    ]
-)
+GROUPED_TAGS = {
+    "area/visualizations": "viz",
+    "area/datatypes": "datatypes",
+    "area/tools": "tools",
+    "area/workflows": "workflows",
+    "area/client": "ui",
+    "area/jobs": "jobs",
+    "area/admin": "admin",
+}
+# In order of precedence, a pull request is grouped under its first matching tag.
+GROUPED_TAG_ITEMS = tuple(GROUPED_TAGS.items())
+
+# Treat procedures as an implicit enhancement.
+ENHANCEMENT_LABELS = frozenset(["kind/enhancement", "procedures"])
+SMALL_ENHANCEMENT_LABELS = frozenset(["kind/testing", "kind/refactoring"])
+
+
+@dataclass
+class SimplePR:
+    """Pull request fields needed for release notes, as returned by a single GraphQL query."""
+
+    number: int
+    title: str
+    html_url: str
+    user_login: str
+    labels: List[str]
+    merged_at: Optional[datetime.datetime] = None
+
+
+def _graphql_node_to_pr(node: Dict[str, Any]) -> SimplePR:
+    author = node["author"]
+    merged_at = node["mergedAt"]
+    return SimplePR(
+        number=node["number"],
+        title=node["title"],
+        html_url=node["url"],
+        # The author of a PR is null if their account has been deleted.
+        user_login=author["login"] if author else "ghost",
+        labels=[label["name"] for label in node["labels"]["nodes"]],
+        merged_at=datetime.datetime.strptime(merged_at, "%Y-%m-%dT%H:%M:%SZ") if merged_at else None,
+    )
 
 
 def _pr_to_str(pr):
@@ -27,63 +71,45 @@ def _pr_to_str(pr):
     return f"PR #{pr.number} ({pr.title}) {pr.html_url}"
 
 
-def _text_target(pull_request: PullRequest, skip_merge=True):
+def _text_target(pull_request: Union["PullRequest", SimplePR], skip_merge=True, labels: Optional[Iterable[str]] = None):
+    """Return the release notes target of a pull request.
+
+    ``labels`` are the pull request's lowercased labels, if the caller already has them.
+    """
     pr_number = pull_request.number
-    labels = [label.name.lower() for label in pull_request.labels]
-    is_bug = is_enhancement = is_feature = is_minor = is_major = is_merge = is_small_enhancement = False
+    labels = frozenset(_pr_to_labels(pull_request) if labels is None else labels)
     if len(labels) == 0:
         print(f"No labels found for {pr_number}")
         return None
-    for label_name in labels:
-        if label_name == "minor":
-            is_minor = True
-        elif label_name == "major":
-            is_major = True
-        elif label_name == "merge":
-            is_merge = True
-        elif label_name == "kind/bug":
-            is_bug = True
-        elif label_name == "kind/feature":
-            is_feature = True
-        elif label_name == "kind/enhancement":
-            is_enhancement = True
-        elif label_name in ["kind/testing", "kind/refactoring"]:
-            is_small_enhancement = True
-        elif label_name == "procedures":
-            # Treat procedures as an implicit enhancement.
-            is_enhancement = True
+    is_merge = "merge" in labels
+    if "minor" in labels or is_merge and skip_merge:
+        return None
+
+    is_major = "major" in labels
+    is_bug = "kind/bug" in labels
+    is_feature = "kind/feature" in labels
+    is_enhancement = not labels.isdisjoint(ENHANCEMENT_LABELS)
+    is_small_enhancement = not labels.isdisjoint(SMALL_ENHANCEMENT_LABELS)
 
     is_some_kind_of_enhancement = is_enhancement or is_feature or is_small_enhancement
 
-    if not (is_bug or is_some_kind_of_enhancement or is_minor or is_merge):
+    if not (is_bug or is_some_kind_of_enhancement or is_merge):
         print(f"No 'kind/*' or 'minor' or 'merge' or 'procedures' label found for {_pr_to_str(pull_request)}")
-        text_target = None
-
-    if is_minor or is_merge and skip_merge:
-        return
 
     if is_some_kind_of_enhancement and is_major:
         text_target = "major_feature"
     elif is_feature:
         text_target = "feature"
     elif is_enhancement:
-        for label, tag in GROUPED_TAGS.items():
-            if label in labels:
-                text_target = f"enhancement_tag_{tag}"
-                break
-        else:
-            text_target = "enhancement"
+        tag = _grouped_tag(labels)
+        text_target = f"enhancement_tag_{tag}" if tag else "enhancement"
     elif is_some_kind_of_enhancement:
         text_target = "small_enhancement"
     elif is_major:
         text_target = "major_bug"
     elif is_bug:
-        for label, tag in GROUPED_TAGS.items():
-            if label in labels:
-                text_target = f"bug_tag_{tag}"
-                break
-        else:
-            text_target = "bug"
+        tag = _grouped_tag(labels)
+        text_target = f"bug_tag_{tag}" if tag else "bug"
     else:
         print(f"Logic problem, cannot determine section for {_pr_to_str(pull_request)}")
         text_target = None
@@ -92,10 +118,17 @@ def _text_target(pull_request: PullRequest, skip_merge=True):
     return text_target
 
 
-def _pr_to_labels(pr: PullRequest) -> List[str]:
+def _grouped_tag(labels: FrozenSet[str]) -> Optional[str]:
+    return next((tag for label, tag in GROUPED_TAG_ITEMS if label in labels), None)
+
+
+def _pr_to_labels(pr: Union["PullRequest", SimplePR]) -> List[str]:
+    if isinstance(pr, SimplePR):
+        return [label.lower() for label in pr.labels]
     labels = [label.name.lower() for label in pr.labels]
     return labels
 
 
 def strip_release(message):
-    return re.sub(r"^\s*\[[\w,\.,-]*\]\s*", r"", message)
+    match = RELEASE_TAG_REGEX.match(message)
+    return message[match.end() :] if match else message
@@ -1,10 +1,13 @@
 import datetime
+import os
+import posixpath
 import re
 import subprocess
 from dataclasses import (
     dataclass,
     field,
 )
+from functools import lru_cache
 from pathlib import Path
 from typing import (
     Dict,
@@ -20,7 +23,6 @@ from docutils import (
     utils,
 )
 from docutils.parsers.rst import Parser
-from github import PullRequest
 from packaging.version import Version
 
 from .cli.options import (
@@ -28,9 +30,11 @@ from .cli.options import (
     galaxy_root_option,
     group_options,
 )
-from .github_client import github_client
+from .github_client import graphql_query
 from .metadata import (
+    _graphql_node_to_pr,
     _text_target,
+    SimplePR,
     strip_release,
 )
 from .util import (
@@ -38,7 +42,6 @@ from .util import (
     version_filepath,
 )
 
-g = github_client()
 PROJECT_OWNER = "galaxyproject"
 PROJECT_NAME = "galaxy"
 REPO = f"{PROJECT_OWNER}/{PROJECT_NAME}"
@@ -50,8 +53,31 @@ HISTORY_TEMPLATE = """History
 .. to_doc
 
 """
-RELEASE_BRANCH_REGEX = re.compile(r"^release_(\d{2}\.\d{1,2})$")
+RELEASE_BRANCH_REGEX = re.compile(r"^release_(\d{2})\.(\d{1,2})$")
+SETUP_CFG_VERSION_REGEX = re.compile(r"^version = (.*)$", re.MULTILINE)
 FIRST_RELEASE_CHANGELOG_TEXT = "First release"
+# Commits whose pull requests are looked up with a single GraphQL query.
+COMMIT_PRS_BATCH_SIZE = 50
+COMMIT_PRS_FRAGMENT = """
+fragment commitPullRequests on Commit {
+  associatedPullRequests(first: 10) {
+    nodes {
+      number
+      title
+      url
+      mergedAt
+      author {
+        login
+      }
+      labels(first: 100) {
+        nodes {
+          name
+        }
+      }
+    }
+  }
+}
+"""
 
 
 @dataclass
@@ -82,12 +108,8 @@ class ChangelogItem:
             version_line = f"{self.version} ({self.date})"
         else:
             version_line = str(self.version)
-        return f"""{'-' * len(version_line)}
-{version_line}
-{'-' * len(version_line)}
-
-{change_lines}
-"""
+        underline = "-" * len(version_line)
+        return f"{underline}\n{version_line}\n{underline}\n\n{change_lines}\n"
 
 
 @dataclass
@@ -95,7 +117,7 @@ class Package:
     path: Path
     current_version: str
     commits: Set[str] = field(default_factory=set)
-    prs: Set[PullRequest.PullRequest] = field(default_factory=set)
+    prs: List[SimplePR] = field(default_factory=list)
     modified_paths: List[Path] = field(default_factory=list)
     package_history: List[ChangelogItem] = field(default_factory=list)
     release_items: List[ReleaseItem] = field(default_factory=list)
@@ -151,15 +173,10 @@ def get_sorted_package_paths(galaxy_root: Path) -> List[Path]:
 
 def read_package(package_path: Path) -> Package:
     setup_cfg = package_path / "setup.cfg"
-    package = None
-    with setup_cfg.open() as content:
-        for line in content:
-            if line.startswith("version = "):
-                version = line.strip().split("version = ")[-1]
-                package = Package(path=package_path, current_version=version)
-                break
-    if not package:
+    match = SETUP_CFG_VERSION_REGEX.search(setup_cfg.read_text())
+    if not match:
         raise ValueError(f"{setup_cfg} does not contain version line")
+    package = Package(path=package_path, current_version=match.group(1).strip())
     package.package_history = parse_changelog(package)
     return package
 
@@ -170,8 +187,7 @@ def parse_changelog(package: Package) -> List[ChangelogItem]:
         if rawsource:
             changes.append(f"* {rawsource}")
 
-    settings = frontend.get_default_settings(Parser)  # type: ignore[attr-defined] ## upstream type stubs not updated?
-    document = utils.new_document(str(package.history_rst), settings)
+    document = utils.new_document(str(package.history_rst), _rst_settings())
     Parser().parse(package.history_rst.read_text(), document)
     changelog_items: List[ChangelogItem] = []
     root_section = document[0]
@@ -231,79 +247,146 @@ def parse_changelog(package: Package) -> List[ChangelogItem]:
     )
 
 
+@lru_cache(maxsize=1)
+def _rst_settings():
+    # Building docutils' default settings runs its whole option parser, do it once for all packages.
+    return frontend.get_default_settings(Parser)  # type: ignore[attr-defined] ## upstream type stubs not updated?
+
+
 def bump_package_version(package: Package, new_version: Version) -> None:
-    new_content = []
-    content = package.setup_cfg.read_text().splitlines()
-    for line in content:
-        if line.startswith("version = "):
-            line = f"version = {new_version}"
-        new_content.append(line)
-    package.setup_cfg.write_text("\n".join(new_content))
+    content = package.setup_cfg.read_text()
+    package.setup_cfg.write_text(SETUP_CFG_VERSION_REGEX.sub(f"version = {new_version}", content))
     package.modified_paths.append(package.setup_cfg)
 
 
-def get_commits_since_last_version(package: Package, last_version_tag: str) -> Set[str]:
-    click.echo(f"finding commits to package {package.name} made since {last_version_tag}")
+def get_package_source_paths(package: Package) -> List[Path]:
     package_source_paths = []
-    commits = set()
     for code_dir in ["galaxy", "tests", "galaxy_test"]:
         package_code_path = package.path / code_dir
         if package_code_path.exists():
-            # get all symlinks pointing to a directory
-            for item in package_code_path.iterdir():
-                # Check if the item is a symlink and if its target points to a directory
-                if item.is_symlink() and item.resolve().is_dir():
-                    package_source_paths.append(item.resolve())
-    for package_source_path in package_source_paths:
-        result = subprocess.run(
-            [
-                "git",
-                "log",
-                "--oneline",
-                "--no-merges",
-                "--pretty=format:%h",
-                f"{last_version_tag}..HEAD",
-                package_source_path,
-            ],
-            cwd=package.path,
-            capture_output=True,
-            text=True,
-        )
-        try:
-            result.check_returncode()
-        except subprocess.CalledProcessError as err:
-            if "unknown revision" in result.stderr:
-                raise Exception(
-                    f"last version tag `{last_version_tag}` was not recognized by git as a valid revision identifier"
-                ) from err
-            raise err
+            # get all symlinks pointing to a directory, scandir knows about symlinks without an extra stat call
+            with os.scandir(package_code_path) as entries:
+                for entry in entries:
+                    if entry.is_symlink():
+                        target = Path(entry.path).resolve()
+                        if target.is_dir():
+                            package_source_paths.append(target)
+    return package_source_paths
 
-        for line in result.stdout.splitlines():
-            if line:
-                commits.add(line)
-    return commits
 
+def find_commits_since_last_version(galaxy_root: Path, packages: List[Package], last_version_tag: str) -> None:
+    """Set the commits changing the sources of each package since ``last_version_tag``.
 
-def commits_to_prs(packages: List[Package]) -> None:
-    commits = set.union(*(p.commits for p in packages))
-    pr_cache = {}
-    commit_to_pr = {}
-    repo = g.get_repo(REPO)
-    total_commits = len(commits)
-    for i, commit in enumerate(commits):
-        click.echo(f"Processing commit {i + 1} of {total_commits}")
-        # Get the list of pull requests associated with the commit
-        commit_obj = repo.get_commit(commit)
-        prs = commit_obj.get_pulls()
+    A single ``git log`` lists the files changed by each commit, which are then matched to the package source paths.
+    """
+    click.echo(f"finding commits to packages made since {last_version_tag}")
+    resolved_root = galaxy_root.resolve()
+    source_path_packages: Dict[str, List[Package]] = {}
+    for package in packages:
+        package.commits = set()
+        for source_path in get_package_source_paths(package):
+            try:
+                relative_source_path = source_path.relative_to(resolved_root).as_posix()
+            except ValueError:
+                click.echo(
+                    f"Skipping source path {source_path} of package {package.name}, it is outside of {galaxy_root}"
+                )
+                continue
+            source_path_packages.setdefault(relative_source_path, []).append(package)
+    if not source_path_packages:
+        return
+    result = subprocess.run(
+        [
+            "git",
+            "log",
+            "--no-merges",
+            # don't simplify history against the combined paths of all packages, so each package gets the same
+            # commits as a git log over its own paths
+            "--full-history",
+            # list both sides of renames, so moving files between packages counts for both of them
+            "--no-renames",
+            "--name-only",
+            "--relative",
+            "--pretty=format:%x00%H",
+            f"{last_version_tag}..HEAD",
+            "--",
+            *source_path_packages,
+        ],
+        cwd=galaxy_root,
+        capture_output=True,
+        text=True,
+    )
+    try:
+        result.check_returncode()
+    except subprocess.CalledProcessError as err:
+        if "unknown revision" in result.stderr or "bad revision" in result.stderr:
+            raise Exception(
+                f"last version tag `{last_version_tag}` was not recognized by git as a valid revision identifier"
+            ) from err
+        raise err
+
+    for record in result.stdout.split("\0")[1:]:
+        commit, *changed_files = record.splitlines()
+        for changed_file in changed_files:
+            directory = posixpath.dirname(changed_file)
+            while directory:
+                for package in source_path_packages.get(directory, []):
+                    package.commits.add(commit)
+                directory = posixpath.dirname(directory)
+
+
+def commits_to_prs(packages: List[Package], skip_commits_without_prs: bool = False) -> None:
+    commits: Set[str] = set()
+    for package in packages:
+        commits |= package.commits
+    pr_cache: Dict[int, SimplePR] = {}
+    commit_to_pr: Dict[str, SimplePR] = {}
+    for commit, prs in get_commit_prs(sorted(commits)).items():
         if not prs:
-            raise Exception(f"commit {commit} has no associated PRs")
+            if not skip_commits_without_prs:
+                raise Exception(f"commit {commit} has no associated PRs")
+            click.echo(f"commit {commit} has no associated PRs, skipping it")
+            continue
         for pr in prs:
             if pr.number not in pr_cache:
                 pr_cache[pr.number] = pr
             commit_to_pr[commit] = pr_cache[pr.number]
     for package in packages:
         # Exclude commits without PRs
-        package.prs = set(commit_to_pr[commit] for commit in package.commits if commit in commit_to_pr)
+        package_prs = (commit_to_pr[commit] for commit in package.commits if commit in commit_to_pr)
+        package.prs = list({pr.number: pr for pr in package_prs}.values())
+
+
+def get_commit_prs(commits: List[str]) -> Dict[str, List[SimplePR]]:
+    """Return the pull requests associated with each commit, looked up in batches of GraphQL queries."""
+    total_commits = len(commits)
+    commit_prs: Dict[str, List[SimplePR]] = {}
+    for start in range(0, total_commits, COMMIT_PRS_BATCH_SIZE):
+        batch = commits[start : start + COMMIT_PRS_BATCH_SIZE]
+        click.echo(f"Processing commits {start + 1} to {start + len(batch)} of {total_commits}")
+        variables = {"owner": PROJECT_OWNER, "name": PROJECT_NAME}
+        variables.update((f"commit{i}", commit) for i, commit in enumerate(batch))
+        repository = graphql_query(_commit_prs_query(len(batch)), variables)["repository"]
+        for i, commit in enumerate(batch):
+            # Commits unknown to GitHub come back as null objects.
+            commit_node = repository[f"commit{i}"]
+            pr_nodes = commit_node["associatedPullRequests"]["nodes"] if commit_node else []
+            commit_prs[commit] = [_graphql_node_to_pr(node) for node in pr_nodes]
+    return commit_prs
+
+
+def _commit_prs_query(n_commits: int) -> str:
+    commit_variables = "".join(f", $commit{i}: String!" for i in range(n_commits))
+    commit_objects = "\n".join(
+        f"    commit{i}: object(expression: $commit{i}) {{ ...commitPullRequests }}" for i in range(n_commits)
+    )
+    return f"""
+query($owner: String!, $name: String!{commit_variables}) {{
+  repository(owner: $owner, name: $name) {{
+{commit_objects}
+  }}
+}}
+{COMMIT_PRS_FRAGMENT}"""
 
 
 def get_package_history(package: Package, new_version: Version) -> ChangelogItem:
@@ -329,7 +412,7 @@ def get_package_history(package: Package, new_version: Version) -> ChangelogItem
                 if "enhancement" in text_target or "feature" in text_target:
                     category = "Enhancements"
             changes[category].append(
-                f"* {strip_release(pr.title)} by `@{pr.user.login} <https://github.com/{pr.user.login}>`_ in `#{pr.number} <{pr.html_url}>`_"
+                f"* {strip_release(pr.title)} by `@{pr.user_login} <https://github.com/{pr.user_login}>`_ in `#{pr.number} <{pr.html_url}>`_"
             )
 
     for kind, entries in changes.items():
@@ -405,19 +488,16 @@ def get_branches(galaxy_root: Path, new_version: Version, current_branch: str) -
     """
     Tries to get release and dev branches that we need to merge forward to.
     """
-    major_minor_new_version = Version(f"{new_version.major}.{new_version.minor}")
-    cmd = ["git", "branch", "--format=%(refname:short)"]
+    major_minor_new_version = (new_version.major, new_version.minor)
+    cmd = ["git", "branch", "--list", "--format=%(refname:short)", "release_*"]
     result = subprocess.run(cmd, cwd=galaxy_root, capture_output=True, text=True)
     result.check_returncode()
     release_branches = []
     branches = result.stdout.splitlines()
     for branch in branches:
         match = RELEASE_BRANCH_REGEX.match(branch)
-        if match:
-            version = match.group(1)
-            branch_version = Version(version)
-            if branch_version > major_minor_new_version:
-                release_branches.append(branch)
+        if match and (int(match.group(1)), int(match.group(2))) > major_minor_new_version:
+            release_branches.append(branch)
     if current_branch != "dev":
         release_branches.append("dev")
     return release_branches
@@ -431,6 +511,7 @@ def merge_and_resolve_branches(
 ) -> None:
     checkout_cmd = ["git", "checkout", new_branch]
     subprocess.run(checkout_cmd, cwd=galaxy_root).check_returncode()
+    dev_version = get_root_version(galaxy_root)
 
     package_paths = {p.path: p for p in packages}
     packages_to_rewrite: List[Package] = []
@@ -443,24 +524,17 @@ def merge_and_resolve_branches(
     merge_cmd = ["git", "merge", base_branch]
     result = subprocess.run(merge_cmd, cwd=galaxy_root, capture_output=True, text=True)
     merge_conflict = result.returncode != 0  # merge conflict expected
-    # restore base galaxy version
-    subprocess.run(
-        [
-            "git",
-            "checkout",
-            new_branch,
-            str(version_filepath(galaxy_root)),
-        ],
-        cwd=galaxy_root,
-    )
     # we rewrite the packages changelog
+    history_paths: List[str] = []
+    # galaxy version and package versions of the new branch, restored after rewriting the changelogs
+    restore_paths = [str(version_filepath(galaxy_root))]
     for new_package in packages_to_rewrite:
         previous_package = package_paths[new_package.path]
         combined_history = previous_package.package_history + new_package.package_history
-        new_history: List[ChangelogItem] = []
-        last_changelog_item: Optional[ChangelogItem] = None
-        for changelog_item in sorted(combined_history, key=lambda item: item.version, reverse=True):
-            if last_changelog_item and changelog_item.version == last_changelog_item.version:
+        new_history: Dict[Version, ChangelogItem] = {}
+        for changelog_item in combined_history:
+            last_changelog_item = new_history.get(changelog_item.version)
+            if last_changelog_item:
                 assert (
                     last_changelog_item.changes == changelog_item.changes
                 ), f"Changelog differs for version {changelog_item.version} of package {new_package.name}, you have to fix this manually.\nOffending lines are {last_changelog_item.changes} and {changelog_item.changes}"
@@ -468,22 +542,21 @@ def merge_and_resolve_branches(
             if not changelog_item.date and not changelog_item.changes:
                 # dev0 version, we'll inject that later
                 continue
-            new_history.append(changelog_item)
-            last_changelog_item = changelog_item
+            new_history[changelog_item.version] = changelog_item
         # we change the original package in place so this continues to work if we merge forward across multiple branches
+        # Point releases of older branches can be newer than releases of newer branches, so order by date first.
         previous_package.package_history = sorted(
-            new_history,
-            key=lambda item: item.datetime_date,
+            new_history.values(),
+            key=lambda item: (item.datetime_date, item.version),
             reverse=True,
         )
-        dev_version = get_root_version(galaxy_root)
         previous_package.package_history.insert(0, ChangelogItem(version=dev_version, changes=[], date=None))
         previous_package.write_history()
-        subprocess.run(["git", "add", str(previous_package.history_rst)], cwd=galaxy_root)
-        # restore setup.cfg
-        subprocess.run(
-            ["git", "checkout", new_branch, str(previous_package.setup_cfg)], cwd=galaxy_root
-        ).check_returncode()
+        history_paths.append(str(previous_package.history_rst))
+        restore_paths.append(str(previous_package.setup_cfg))
+    if history_paths:
+        subprocess.run(["git", "add", *history_paths], cwd=galaxy_root).check_returncode()
+    subprocess.run(["git", "checkout", new_branch, "--", *restore_paths], cwd=galaxy_root).check_returncode()
     # Commit changes
     if merge_conflict:
         subprocess.run(["git", "commit", "--no-edit"], cwd=galaxy_root).check_returncode()
@@ -518,30 +591,38 @@ def is_merge_required(base_branch: str, new_branch: str, galaxy_root: Path) -> b
     return True
 
 
-def ensure_branches_up_to_date(branches: List[str], base_branch: str, upstream: str, galaxy_root: Path) -> None:
+def ensure_branches_up_to_date(branches: List[str], upstream: str, galaxy_root: Path) -> None:
     click.echo("Making sure that all branches are up to date")
-    try:
-        for branch in branches:
-            subprocess.run(["git", "checkout", branch], cwd=galaxy_root).check_returncode()
-            # Check that the head commit matches the commit for the same branch at the specified remote repo url
-            result = subprocess.run(
-                ["git", "ls-remote", upstream, f"refs/heads/{branch}"],
-                cwd=galaxy_root,
-                capture_output=True,
-                text=True,
+    refs = [f"refs/heads/{branch}" for branch in branches]
+    # Check that the head commit of each branch matches the commit for the same branch at the specified remote repo url
+    result = subprocess.run(["git", "ls-remote", upstream, *refs], cwd=galaxy_root, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"Could not list branches {', '.join(branches)} of {upstream}: {result.stderr}")
+    remote_commit_hashes: Dict[str, str] = {}
+    for line in result.stdout.splitlines():
+        commit_hash, ref = line.split("\t")
+        remote_commit_hashes[ref] = commit_hash
+    result = subprocess.run(
+        ["git", "for-each-ref", "--format=%(refname) %(objectname)", *refs],
+        cwd=galaxy_root,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise Exception(f"Could not list local branches {', '.join(branches)}: {result.stderr}")
+    local_commit_hashes = dict(line.split(" ") for line in result.stdout.splitlines())
+    missing_branches = [branch for branch, ref in zip(branches, refs) if ref not in local_commit_hashes]
+    if missing_branches:
+        raise Exception(
+            f"Branches missing locally: {', '.join(missing_branches)}. Create them from {upstream} before creating the release."
+        )
+    for branch, ref in zip(branches, refs):
+        local_commit_hash = local_commit_hashes[ref]
+        remote_commit_hash = remote_commit_hashes.get(ref, "")
+        if remote_commit_hash != local_commit_hash:
+            raise Exception(
+                f"Local tip of branch {branch} is {local_commit_hash}, remote tip of branch is {remote_commit_hash}. Make sure that your local branches are up to date and track {upstream}."
             )
-            result.check_returncode()
-            remote_commit_hash = result.stdout.split("\t")[0]
-            result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=galaxy_root, capture_output=True, text=True)
-            result.check_returncode()
-            local_commit_hash = result.stdout.strip()
-            if remote_commit_hash != local_commit_hash:
-                raise Exception(
-                    f"Local tip of branch {branch} is {local_commit_hash}, remote tip of branch is {remote_commit_hash}. Make sure that your local branches are up to date and track f{upstream}."
-                )
-    finally:
-        if branch != base_branch:
-            subprocess.run(["git", "checkout", base_branch], cwd=galaxy_root).check_returncode()
 
 
 def ensure_clean_merges(newer_branches: List[str], base_branch: str, galaxy_root: Path, no_confirm: bool) -> None:
@@ -619,6 +700,13 @@ def build_and_upload(
 @click.option("--build-packages/--no-build-packages", type=bool, is_flag=True, default=True)
 @click.option("--upload-packages", type=bool, is_flag=True, default=False)
 @click.option("--upstream", type=str, default=DEFAULT_UPSTREAM_URL)
+@click.option(
+    "--skip-commits-without-prs",
+    type=bool,
+    is_flag=True,
+    default=False,
+    help="Leave commits without an associated pull request out of the changelogs instead of failing.",
+)
 @group_options(packages_option, no_confirm_option)
 def create_point_release(
     galaxy_root: Path,
@@ -629,6 +717,7 @@ def create_point_release(
     upload_packages: bool,
     no_confirm: bool,
     upstream: str,
+    skip_commits_without_prs: bool,
 ):
     verify_galaxy_root(galaxy_root)
     check_galaxy_repo_is_clean(galaxy_root)
@@ -636,14 +725,14 @@ def create_point_release(
     user_confirmation(galaxy_root, new_version, base_branch, no_confirm)
     newer_branches = get_branches(galaxy_root, new_version, base_branch)
     all_branches = newer_branches + [base_branch]
-    ensure_branches_up_to_date(all_branches, base_branch, upstream, galaxy_root)
+    ensure_branches_up_to_date(all_branches, upstream, galaxy_root)
     ensure_clean_merges(newer_branches, base_branch, galaxy_root, no_confirm)
     version_py = version_filepath(galaxy_root)
 
     set_root_version(version_py, new_version)
     modified_paths = [version_py]
     packages = load_packages(galaxy_root, package_subset, last_commit)
-    commits_to_prs(packages)
+    commits_to_prs(packages, skip_commits_without_prs)
     update_packages(packages, new_version, modified_paths)
     run_build_packages(build_packages, packages)
     show_modified_paths_and_diff(galaxy_root, modified_paths, no_confirm)
@@ -689,7 +778,7 @@ def load_packages(galaxy_root: Path, package_subset: List[str], last_commit: str
             continue
         package = read_package(package_path)
         packages.append(package)
-        package.commits = get_commits_since_last_version(package, last_commit)
+    find_commits_since_last_version(galaxy_root, packages, last_commit)
     return packages
 
 
@@ -745,11 +834,11 @@ def stage_changes_and_commit(
         click.confirm("Stage and commit changes ?", abort=True)
 
     cmd = ["git", "add"]
-    changed_paths = [str(p) for p in modified_paths]
-    cmd.extend(changed_paths)
-    subprocess.run(cmd, cwd=galaxy_root)
+    unique_paths = list(dict.fromkeys(str(p) for p in modified_paths))
+    cmd.extend(unique_paths)
+    subprocess.run(cmd, cwd=galaxy_root).check_returncode()
 
-    subprocess.run(["git", "commit", "-m", commit_message], cwd=galaxy_root)
+    subprocess.run(["git", "commit", "-m", commit_message], cwd=galaxy_root).check_returncode()
 
 
 def create_tag(galaxy_root: Path, release_tag: str, no_confirm: bool) -> None:
@@ -784,8 +873,8 @@ def merge_changes_into_newer_branches(
 def push_references(galaxy_root: Path, release_tag: str, branches: List[str], upstream: str, no_confirm: bool) -> None:
     references = [release_tag] + branches
     if no_confirm or click.confirm(f"Push {','.join(references)} to upstream '{upstream}' ?", abort=True):
-        for reference in references:
-            subprocess.run(["git", "push", upstream, reference], cwd=galaxy_root).check_returncode()
+        # push all references at once, so the release is either pushed completely or not at all
+        subprocess.run(["git", "push", "--atomic", upstream, *references], cwd=galaxy_root).check_returncode()
 
 
 if __name__ == "__main__":
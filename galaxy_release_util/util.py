@@ -1,4 +1,3 @@
-import os
 from pathlib import Path
 
 
@@ -7,6 +6,6 @@ def version_filepath(galaxy_root: Path) -> Path:
 
 
 def verify_galaxy_root(galaxy_root: Path):
-    if not os.path.exists(version_filepath(galaxy_root)):
+    if not version_filepath(galaxy_root).exists():
         msg = f"Galaxy files not found at `{galaxy_root}`. If you are running this script outside of galaxy root directory, you should specify the '--galaxy-root' argument"
         raise Exception(msg)
@@ -7,10 +7,22 @@ from packaging.version import Version
 
 from galaxy_release_util import bootstrap_history
 from galaxy_release_util.bootstrap_history import (  # _get_release_date,
+    _extend_targets,
     _get_next_release_version,
     _get_previous_release_version,
+    _get_prs,
+    _get_release_documentation_filenames,
     _get_release_version_strings,
+    _search_issues,
+    _write_file,
+    check_blocking_issues,
+    check_blocking_prs,
     create_changelog,
+    wrap,
+)
+from galaxy_release_util.metadata import (
+    PROJECT_URL,
+    SimplePR,
 )
 
 
@@ -63,6 +75,16 @@ def test_get_previous_release_version(monkeypatch):
     assert _get_previous_release_version(None, Version("99.99")) == Version("23.1")
 
 
+def test_get_previous_release_version_orders_by_version(monkeypatch):
+    # "9.0" sorts after "23.1" as a string, but is the oldest release.
+    filenames = ["23.0.rst", "23.1.rst", "9.0.rst"]
+    monkeypatch.setattr(bootstrap_history, "_get_release_documentation_filenames", lambda x: filenames)
+
+    assert _get_previous_release_version(None, Version("9.0")) is None
+    assert _get_previous_release_version(None, Version("23.0")) == Version("9.0")
+    assert _get_previous_release_version(None, Version("24.0")) == Version("23.1")
+
+
 def test_get_next_release_version():
     assert _get_next_release_version(Version("25.0")) == Version("25.1")
     assert _get_next_release_version(Version("26.1")) == Version("26.2")
@@ -75,6 +97,8 @@ def test_get_release_version_strings(monkeypatch):
         "22.05.rst",
         "23.0.rst",
         "23.1.rst",
+        "23.2xrst",
+        "23.2.rst.orig",
         "23.not_a_release.rst",
         "not_a_release.23.rst",
     ]
@@ -82,6 +106,54 @@ def test_get_release_version_strings(monkeypatch):
     assert _get_release_version_strings(None) == ["22.01", "22.05", "23.0", "23.1"]
 
 
+def test_get_release_version_strings_orders_by_version(monkeypatch):
+    filenames = ["23.1.rst", "22.05.rst", "23.10.rst", "23.5.rst", "9.0.rst"]
+    monkeypatch.setattr(bootstrap_history, "_get_release_documentation_filenames", lambda x: filenames)
+    assert _get_release_version_strings(None) == ["9.0", "22.05", "23.1", "23.5", "23.10"]
+
+
+def test_get_release_documentation_filenames(tmp_path):
+    releases_path = tmp_path / "doc" / "source" / "releases"
+    releases_path.mkdir(parents=True)
+    for filename in ["23.0_prs.rst", "index.rst", "23.0.rst", "older_releases.rst", "23.0_announce.rst", "22.05.rst"]:
+        (releases_path / filename).touch()
+    (releases_path / "23.1.rst").mkdir()
+    # only versioned .rst files, sorted by name
+    filenames = _get_release_documentation_filenames(tmp_path)
+    assert filenames == ["22.05.rst", "23.0.rst", "23.0_announce.rst", "23.0_prs.rst"]
+    with pytest.raises(Exception, match="Path to releases documentation not found"):
+        _get_release_documentation_filenames(tmp_path / "missing")
+
+
+def test_extend_targets():
+    source = "\n.. first\n\n.. second\nend\n"
+    insertions = {"second": ["b1", "b2"], "first": ["a1"]}
+    assert _extend_targets(source, insertions) == "\n.. first\na1\n\n.. second\nb2\nb1\nend\n"
+    assert _extend_targets(source, {}) == source
+    assert _extend_targets(".. bug\n.. bug\n\n", {"bug": ["a"], "bug\n": ["b"]}) == ".. bug\na\n.. bug\n\nb\n"
+    with pytest.raises(Exception, match="Failed to find target"):
+        _extend_targets(source, {"third": ["c1"]})
+
+
+def test_wrap():
+    assert wrap("Short title \n(thanks to jdoe).") == "* Short title\n  (thanks to jdoe)."
+    long_title = " ".join(["word"] * 40)
+    assert wrap(f"{long_title}\nline") == f"* {' '.join(['word'] * 31)}\n  {' '.join(['word'] * 9)}\n  line"
+    assert wrap("Tab\tseparated") == "* Tab     separated"
+
+
+def test_write_file(tmp_path):
+    path = tmp_path / "98.2_announce.rst"
+    _write_file(path, "first")
+    os.utime(path, ns=(0, 0))
+    _write_file(path, "first")
+    assert path.stat().st_mtime_ns == 0
+    _write_file(path, "second", skip_if_exists=True)
+    assert path.read_text() == "first"
+    _write_file(path, "second")
+    assert path.read_text() == "second"
+
+
 def test_create_changelog(
     monkeypatch,
     release_file,
@@ -92,7 +164,7 @@ def test_create_changelog(
 ):
     monkeypatch.setattr(bootstrap_history, "verify_galaxy_root", lambda x: None)
     monkeypatch.setattr(
-        bootstrap_history, "_load_prs", lambda x, y, z: None
+        bootstrap_history, "_load_prs", lambda x, y: None
     )  # We don't want to call github's API on test data.
     runner = CliRunner()
     with runner.isolated_filesystem():
@@ -114,3 +186,180 @@ def test_create_changelog(
             assert f.read() == prs_file
         with open(releases_path / "99.0_announce.rst") as f:
             assert f.read() == next_release_announcement_file
+
+
+def _graphql_pr_node(number, title, labels, login="jdoe"):
+    return {
+        "number": number,
+        "title": title,
+        "url": f"https://github.com/galaxyproject/galaxy/pull/{number}",
+        "mergedAt": "2099-01-02T03:04:05Z",
+        "author": {"login": login},
+        "labels": {"nodes": [{"name": label} for label in labels]},
+    }
+
+
+def test_get_prs(monkeypatch):
+    milestones = {
+        "repository": {"milestones": {"nodes": [{"number": 7, "title": "98.20"}, {"number": 3, "title": "98.2"}]}}
+    }
+    pages = [
+        {
+            "repository": {
+                "milestone": {
+                    "pullRequests": {
+                        "pageInfo": {"endCursor": "abc", "hasNextPage": True},
+                        "nodes": [_graphql_pr_node(1, "First", ["kind/bug"])],
+                    }
+                }
+            }
+        },
+        {
+            "repository": {
+                "milestone": {
+                    "pullRequests": {
+                        "pageInfo": {"endCursor": None, "hasNextPage": False},
+                        "nodes": [dict(_graphql_pr_node(2, "Second", []), author=None)],
+                    }
+                }
+            }
+        },
+    ]
+    queries = []
+
+    def graphql_query(query, variables):
+        queries.append(variables)
+        if "title" in variables:
+            return milestones
+        assert "orderBy: {field: UPDATED_AT, direction: DESC}" in query
+        return pages[len(queries) - 2]
+
+    monkeypatch.setattr(bootstrap_history, "graphql_query", graphql_query)
+    prs = _get_prs(Version("98.2"))
+
+    assert [pr.number for pr in prs] == [1, 2]
+    assert prs[0].labels == ["kind/bug"]
+    assert prs[0].user_login == "jdoe"
+    assert prs[0].merged_at is not None and prs[0].merged_at.year == 2099
+    assert prs[1].user_login == "ghost"
+    assert queries[1]["number"] == 3
+    assert queries[1]["states"] == ["MERGED"]
+    assert queries[1]["cursor"] is None
+    assert queries[2]["cursor"] == "abc"
+
+
+def test_create_changelog_with_prs(monkeypatch):
+    prs = [
+        SimplePR(
+            number=101,
+            title="Fix tool form for #99.",
+            html_url="https://github.com/galaxyproject/galaxy/pull/101",
+            user_login="jdoe",
+            labels=["kind/bug", "area/tools"],
+        ),
+        SimplePR(
+            number=102,
+            title="Add new datatype",
+            html_url="https://github.com/galaxyproject/galaxy/pull/102",
+            user_login="asmith",
+            labels=["kind/feature", "area/datatypes"],
+        ),
+        SimplePR(
+            number=103,
+            title="Already documented",
+            html_url="https://github.com/galaxyproject/galaxy/pull/103",
+            user_login="asmith",
+            labels=["kind/bug"],
+        ),
+    ]
+    monkeypatch.setattr(bootstrap_history, "verify_galaxy_root", lambda x: None)
+    monkeypatch.setattr(bootstrap_history, "_get_prs", lambda x: prs)
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        releases_path = Path("doc") / "source" / "releases"
+        os.makedirs(releases_path)
+        with open(releases_path / "98.2_prs.rst", "w") as f:
+            f.write("\n.. github_links\n.. _Pull Request 103: https://github.com/galaxyproject/galaxy/pull/103\n")
+        result = runner.invoke(
+            create_changelog, ["98.2", "--galaxy-root", ".", "--release-date", "2099-1-15", "--next-version", "99.0"]
+        )
+        assert result.exit_code == 0, result.output
+
+        with open(releases_path / "98.2.rst") as f:
+            release = f.read()
+        with open(releases_path / "98.2_announce_user.rst") as f:
+            user_announcement = f.read()
+        with open(releases_path / "98.2_prs.rst") as f:
+            prs_links = f.read()
+
+    pr_101_doc = (
+        "* Fix tool form for `#99 <https://github.com/galaxyproject/galaxy/issues/99>`__\n"
+        "  (thanks to `@jdoe <https://github.com/jdoe>`__).\n"
+        "  `Pull Request 101`_\n"
+    )
+    pr_102_doc = "* Add new datatype\n  (thanks to `@asmith <https://github.com/asmith>`__).\n  `Pull Request 102`_\n"
+    assert f".. bug_tag_tools\n\n{pr_101_doc}" in release
+    assert f".. feature\n\n{pr_102_doc}" in release
+    assert "Pull Request 103`_" not in release
+    assert f".. tools\n{pr_101_doc}" in user_announcement
+    assert f".. datatypes\n{pr_102_doc}" in user_announcement
+    assert prs_links == (
+        "\n.. github_links\n"
+        ".. _Pull Request 102: https://github.com/galaxyproject/galaxy/pull/102\n"
+        ".. _Pull Request 101: https://github.com/galaxyproject/galaxy/pull/101\n"
+        ".. _Pull Request 103: https://github.com/galaxyproject/galaxy/pull/103\n"
+    )
+
+
+def test_check_blocking_issues(monkeypatch):
+    def issue(number, title):
+        return {"number": number, "title": title, "html_url": f"{PROJECT_URL}/issues/{number}"}
+
+    pages = {
+        1: {"total_count": 101, "items": [issue(1, "Publication of Galaxy Release v 98.2")] * 100},
+        2: {"total_count": 101, "items": [issue(2, "Broken upload")]},
+    }
+    requests = []
+
+    def get_json_cached(url, parameters):
+        requests.append((url, parameters))
+        return pages[parameters["page"]]
+
+    monkeypatch.setattr(bootstrap_history, "get_json_cached", get_json_cached)
+    result = CliRunner().invoke(check_blocking_issues, ["98.2"])
+    assert result.exit_code == 1
+    assert [parameters["page"] for _, parameters in requests] == [1, 2]
+    assert requests[0] == (
+        "/search/issues",
+        {"q": 'repo:galaxyproject/galaxy is:issue is:open milestone:"98.2"', "per_page": 100, "page": 1},
+    )
+    assert "Issue #2 (Broken upload)" in result.output
+    assert "Issue #1" not in result.output
+
+
+def test_check_blocking_prs(monkeypatch):
+    prs = []
+    monkeypatch.setattr(bootstrap_history, "_get_prs", lambda release_version, state: prs)
+    result = CliRunner().invoke(check_blocking_prs, ["98.2"])
+    assert result.exit_code == 0
+    assert "deprecated" not in result.output
+    # --release-date is deprecated but still accepted
+    result = CliRunner().invoke(check_blocking_prs, ["98.2", "--release-date", "2098-02-01"])
+    assert result.exit_code == 0
+    assert "Warning: --release-date is deprecated and ignored" in result.output
+    prs.append(SimplePR(number=1, title="Fix upload", html_url=f"{PROJECT_URL}/pull/1", user_login="jdoe", labels=[]))
+    result = CliRunner().invoke(check_blocking_prs, ["98.2"])
+    assert result.exit_code == 1
+    assert "Blocking PR|" in result.output
+
+
+def test_search_issues_stops_at_results_limit(monkeypatch):
+    pages = []
+
+    def get_json_cached(url, parameters):
+        pages.append(parameters["page"])
+        return {"total_count": 5000, "items": [{"number": 1, "title": "Open"}] * 100}
+
+    monkeypatch.setattr(bootstrap_history, "get_json_cached", get_json_cached)
+    assert len(list(_search_issues("is:open"))) == 1000
+    assert pages == list(range(1, 11))
@@ -0,0 +1,35 @@
+from galaxy_release_util import github_client
+
+
+class FakeRequester:
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+
+    def requestJsonAndCheck(self, verb, url, parameters=None, headers=None):
+        self.requests.append((verb, url, parameters, headers))
+        return self.responses.pop(0)
+
+
+class FakeGithub:
+    def __init__(self, requester):
+        self._Github__requester = requester
+
+
+def test_get_json_cached(monkeypatch, tmp_path):
+    requester = FakeRequester(
+        [
+            ({"etag": '"v1"'}, {"total_count": 1}),
+            ({"etag": '"v1"'}, None),
+            ({"etag": '"v2"'}, {"total_count": 2}),
+        ]
+    )
+    monkeypatch.setattr(github_client, "github_client", lambda: FakeGithub(requester))
+    monkeypatch.setattr(github_client, "CACHE_DIRECTORY", tmp_path)
+
+    assert github_client.get_json_cached("/search/issues", {"q": "x"}) == {"total_count": 1}
+    assert requester.requests[0][3] == {}
+    # 304 Not Modified: the cached response is returned
+    assert github_client.get_json_cached("/search/issues", {"q": "x"}) == {"total_count": 1}
+    assert requester.requests[1][3] == {"If-None-Match": '"v1"'}
+    assert github_client.get_json_cached("/search/issues", {"q": "x"}) == {"total_count": 2}
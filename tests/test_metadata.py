@@ -1,4 +1,10 @@
-from galaxy_release_util.metadata import strip_release
+import pytest
+
+from galaxy_release_util.metadata import (
+    _text_target,
+    SimplePR,
+    strip_release,
+)
 
 
 def test_strip_release():
@@ -13,3 +19,35 @@ def test_strip_release():
     assert strip_release("foo[bar]") == "foo[bar]"
     assert strip_release("foo[]baz") == "foo[]baz"
     assert strip_release("foo[bar]baz") == "foo[bar]baz"
+
+
+@pytest.mark.parametrize(
+    "labels,skip_merge,expected",
+    [
+        ([], True, None),
+        (["kind/bug"], True, "bug\n"),
+        (["Kind/Bug", "area/tools"], True, "bug_tag_tools\n"),
+        (["kind/bug", "area/tools", "area/visualizations"], True, "bug_tag_viz\n"),
+        (["kind/bug", "major"], True, "major_bug\n"),
+        (["major"], True, "major_bug\n"),
+        (["kind/feature"], True, "feature\n"),
+        (["kind/feature", "major"], True, "major_feature\n"),
+        (["kind/enhancement", "kind/bug"], True, "enhancement\n"),
+        (["procedures", "area/jobs"], True, "enhancement_tag_jobs\n"),
+        (["kind/refactoring"], True, "small_enhancement\n"),
+        (["kind/testing", "area/admin"], True, "small_enhancement\n"),
+        (["kind/bug", "minor"], True, None),
+        (["kind/bug", "merge"], True, None),
+        (["kind/bug", "merge"], False, "bug\n"),
+        (["merge"], False, None),
+        (["area/tools"], True, None),
+    ],
+)
+def test_text_target(labels, skip_merge, expected):
+    pr = SimplePR(number=1, title="Title", html_url="https://example.org/1", user_login="jdoe", labels=labels)
+    assert _text_target(pr, skip_merge=skip_merge) == expected
+
+
+def test_text_target_with_labels():
+    pr = SimplePR(number=1, title="Title", html_url="https://example.org/1", user_login="jdoe", labels=["kind/bug"])
+    assert _text_target(pr, labels=["kind/feature"]) == "feature\n"
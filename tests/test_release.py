@@ -1,11 +1,27 @@
 import pathlib
+import subprocess
 
 import pytest
+from packaging.version import Version
 
+from galaxy_release_util import point_release
 from galaxy_release_util.point_release import (
+    bump_package_version,
+    commits_to_prs,
+    ensure_branches_up_to_date,
+    find_commits_since_last_version,
+    get_branches,
+    get_current_branch,
     get_next_devN_version,
     get_root_version,
     get_sorted_package_paths,
+    load_packages,
+    merge_and_resolve_branches,
+    Package,
+    parse_changelog,
+    push_references,
+    read_package,
+    stage_changes_and_commit,
 )
 
 VERSION_PY_CONTENTS = """VERSION_MAJOR = "23.0"
@@ -56,3 +72,413 @@ def test_get_sorted_package_paths(galaxy_root):
     assert packages[0].name == "foo"
     assert packages[1].name == "bar"
     assert packages[2].name == "baz"
+
+
+def test_commits_to_prs(monkeypatch):
+    def pr_node(number, login):
+        return {
+            "number": number,
+            "title": f"PR {number}",
+            "url": f"https://github.com/galaxyproject/galaxy/pull/{number}",
+            "mergedAt": "2099-01-02T03:04:05Z",
+            "author": {"login": login} if login else None,
+            "labels": {"nodes": [{"name": "kind/bug"}]},
+        }
+
+    commit_prs = {"aaa": [pr_node(1, "jdoe")], "bbb": [pr_node(1, "jdoe")], "ccc": [pr_node(2, None)]}
+    queries = []
+
+    def graphql_query(query, variables):
+        queries.append(variables)
+        commit_variables = sorted(name for name in variables if name.startswith("commit"))
+        for name in commit_variables:
+            assert f"{name}: object(expression: ${name})" in query
+        return {
+            "repository": {
+                name: {"associatedPullRequests": {"nodes": commit_prs[variables[name]]}} for name in commit_variables
+            }
+        }
+
+    monkeypatch.setattr(point_release, "graphql_query", graphql_query)
+    monkeypatch.setattr(point_release, "COMMIT_PRS_BATCH_SIZE", 2)
+    foo = Package(path=pathlib.Path("foo"), current_version="23.0", commits={"aaa", "bbb"})
+    bar = Package(path=pathlib.Path("bar"), current_version="23.0", commits={"ccc"})
+    commits_to_prs([foo, bar])
+    assert [pr.number for pr in foo.prs] == [1]
+    assert foo.prs[0].labels == ["kind/bug"]
+    assert [(pr.number, pr.user_login) for pr in bar.prs] == [(2, "ghost")]
+    assert [sorted(v for k, v in variables.items() if k.startswith("commit")) for variables in queries] == [
+        ["aaa", "bbb"],
+        ["ccc"],
+    ]
+
+
+def test_commits_to_prs_without_prs(monkeypatch):
+    pr_node = {
+        "number": 1,
+        "title": "PR 1",
+        "url": "https://github.com/galaxyproject/galaxy/pull/1",
+        "mergedAt": "2099-01-02T03:04:05Z",
+        "author": {"login": "jdoe"},
+        "labels": {"nodes": []},
+    }
+
+    def graphql_query(query, variables):
+        # aaa has a pull request, bbb was pushed directly and ccc is unknown to GitHub
+        commit_nodes = {
+            "aaa": {"associatedPullRequests": {"nodes": [pr_node]}},
+            "bbb": {"associatedPullRequests": {"nodes": []}},
+            "ccc": None,
+        }
+        return {
+            "repository": {name: commit_nodes[value] for name, value in variables.items() if name.startswith("commit")}
+        }
+
+    monkeypatch.setattr(point_release, "graphql_query", graphql_query)
+    package = Package(path=pathlib.Path("foo"), current_version="23.0", commits={"aaa", "bbb", "ccc"})
+    with pytest.raises(Exception, match="commit bbb has no associated PRs"):
+        commits_to_prs([package])
+    commits_to_prs([package], skip_commits_without_prs=True)
+    assert [pr.number for pr in package.prs] == [1]
+
+
+def test_commits_to_prs_without_commits(monkeypatch):
+    monkeypatch.setattr(point_release, "graphql_query", None)
+    commits_to_prs([])
+    package = Package(path=pathlib.Path("foo"), current_version="23.0")
+    commits_to_prs([package])
+    assert package.prs == []
+
+
+def git(cwd: pathlib.Path, *args: str) -> str:
+    return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+
+@pytest.fixture()
+def galaxy_git_root(tmp_path: pathlib.Path):
+    """Galaxy clone with package ``app`` and one commit per library since tag ``v1``."""
+    git(tmp_path, "init", "-q")
+    git(tmp_path, "config", "user.email", "test@example.org")
+    git(tmp_path, "config", "user.name", "Test")
+    write_contents(tmp_path / "packages" / "packages_by_dep_dag.txt", "app\nempty\n")
+    for name in ["files", "util", "other"]:
+        write_contents(tmp_path / "lib" / "galaxy" / name / "__init__.py", "")
+    for package_name in ["app", "empty"]:
+        package_path = tmp_path / "packages" / package_name
+        write_contents(package_path / "setup.cfg", f"[metadata]\nname = galaxy-{package_name}\nversion = 23.0.1.dev0\n")
+        (package_path / "HISTORY.rst").write_text(HISTORY_RST_CONTENTS)
+    (tmp_path / "packages" / "app" / "galaxy").mkdir()
+    for name in ["files", "util"]:
+        (tmp_path / "packages" / "app" / "galaxy" / name).symlink_to(tmp_path / "lib" / "galaxy" / name)
+    # Only symlinks to directories are package sources
+    (tmp_path / "packages" / "app" / "galaxy" / "other.py").symlink_to(
+        tmp_path / "lib" / "galaxy" / "other" / "__init__.py"
+    )
+    (tmp_path / "packages" / "app" / "galaxy" / "__init__.py").write_text("")
+    git(tmp_path, "add", ".")
+    git(tmp_path, "commit", "-q", "-m", "initial")
+    git(tmp_path, "tag", "v1")
+    for name in ["files", "other", "util"]:
+        (tmp_path / "lib" / "galaxy" / name / "__init__.py").write_text(name)
+        git(tmp_path, "commit", "-q", "-am", f"change {name}")
+    return tmp_path
+
+
+HISTORY_RST_CONTENTS = """History
+-------
+
+.. to_doc
+
+-----------
+23.0.1.dev0
+-----------
+
+-------------------
+23.0.0 (2023-02-20)
+-------------------
+
+First release
+"""
+
+
+def commits_changing(galaxy_root: pathlib.Path, *names: str):
+    paths = [str(galaxy_root / "lib" / "galaxy" / name) for name in names]
+    return set(git(galaxy_root, "log", "--pretty=format:%H", "v1..HEAD", *paths).splitlines())
+
+
+def test_find_commits_since_last_version(galaxy_git_root: pathlib.Path):
+    app = Package(path=galaxy_git_root / "packages" / "app", current_version="23.0")
+    other = Package(path=galaxy_git_root / "packages" / "other", current_version="23.0")
+    (other.path / "galaxy").mkdir(parents=True)
+    (other.path / "galaxy" / "other").symlink_to(galaxy_git_root / "lib" / "galaxy" / "other")
+    find_commits_since_last_version(galaxy_git_root, [app, other], "v1")
+    assert len(app.commits) == 2
+    assert app.commits == commits_changing(galaxy_git_root, "files", "util")
+    assert other.commits == commits_changing(galaxy_git_root, "other")
+    # a file moved between packages changes both of them
+    git(galaxy_git_root, "mv", "lib/galaxy/files/__init__.py", "lib/galaxy/other/files.py")
+    git(galaxy_git_root, "commit", "-q", "-m", "move files")
+    move_commit = git(galaxy_git_root, "rev-parse", "HEAD")
+    find_commits_since_last_version(galaxy_git_root, [app, other], "v1")
+    assert move_commit in app.commits
+    assert move_commit in other.commits
+    with pytest.raises(Exception, match="was not recognized by git"):
+        find_commits_since_last_version(galaxy_git_root, [app], "v0")
+
+
+def test_find_commits_since_last_version_across_merges(galaxy_git_root: pathlib.Path):
+    app = Package(path=galaxy_git_root / "packages" / "app", current_version="23.0")
+    other = Package(path=galaxy_git_root / "packages" / "other", current_version="23.0")
+    (other.path / "galaxy").mkdir(parents=True)
+    (other.path / "galaxy" / "other").symlink_to(galaxy_git_root / "lib" / "galaxy" / "other")
+    branch = get_current_branch(galaxy_git_root)
+    git(galaxy_git_root, "checkout", "-q", "-b", "side", "v1")
+    for name in ["files", "other"]:
+        (galaxy_git_root / "lib" / "galaxy" / name / "__init__.py").write_text(f"side {name}")
+    git(galaxy_git_root, "commit", "-q", "-am", "side change")
+    git(galaxy_git_root, "checkout", "-q", branch)
+    # keep the files library of the branch, so the merge is the same as its first parent for package app only
+    subprocess.run(["git", "merge", "-q", "--no-commit", "side"], cwd=galaxy_git_root, capture_output=True)
+    git(galaxy_git_root, "checkout", "HEAD", "--", "lib/galaxy/files")
+    (galaxy_git_root / "lib" / "galaxy" / "other" / "__init__.py").write_text("merged other")
+    git(galaxy_git_root, "commit", "-q", "-am", "merge side")
+    # a merge that discards all changes of the merged branch
+    git(galaxy_git_root, "checkout", "-q", "-b", "discarded", "v1")
+    (galaxy_git_root / "lib" / "galaxy" / "util" / "__init__.py").write_text("discarded util")
+    git(galaxy_git_root, "commit", "-q", "-am", "discarded change")
+    git(galaxy_git_root, "checkout", "-q", branch)
+    git(galaxy_git_root, "merge", "-q", "-s", "ours", "discarded")
+    find_commits_since_last_version(galaxy_git_root, [app, other], "v1")
+    for package, names in [(app, ["files", "util"]), (other, ["other"])]:
+        paths = [f"lib/galaxy/{name}" for name in names]
+        per_path_log = git(
+            galaxy_git_root, "log", "--no-merges", "--full-history", "--pretty=format:%H", "v1..HEAD", "--", *paths
+        )
+        assert package.commits == set(per_path_log.splitlines())
+    assert git(galaxy_git_root, "rev-parse", "side") in app.commits
+    assert git(galaxy_git_root, "rev-parse", "discarded") in app.commits
+
+
+def test_find_commits_since_last_version_outside_galaxy_root(galaxy_git_root: pathlib.Path, tmp_path_factory):
+    outside = Package(path=galaxy_git_root / "packages" / "outside", current_version="23.0")
+    (outside.path / "galaxy").mkdir(parents=True)
+    (outside.path / "galaxy" / "outside").symlink_to(tmp_path_factory.mktemp("outside"))
+    find_commits_since_last_version(galaxy_git_root, [outside], "v1")
+    assert outside.commits == set()
+
+
+def test_load_packages(galaxy_git_root: pathlib.Path):
+    packages = load_packages(galaxy_git_root, [], "v1")
+    assert [package.name for package in packages] == ["app", "empty"]
+    assert packages[0].commits == commits_changing(galaxy_git_root, "files", "util")
+    assert packages[1].commits == set()
+    assert packages[0].current_version == "23.0.1.dev0"
+    assert [str(item.version) for item in packages[0].package_history] == ["23.0.0"]
+
+
+def test_ensure_branches_up_to_date(galaxy_git_root: pathlib.Path, tmp_path_factory):
+    upstream = str(tmp_path_factory.mktemp("upstream") / "galaxy.git")
+    git(galaxy_git_root, "clone", "-q", "--bare", str(galaxy_git_root), upstream)
+    git(galaxy_git_root, "branch", "release_23.0")
+    branches = [get_current_branch(galaxy_git_root), "release_23.0"]
+    with pytest.raises(Exception, match="Local tip of branch release_23.0 is [0-9a-f]+, remote tip of branch is \\."):
+        ensure_branches_up_to_date(branches, upstream, galaxy_git_root)
+    git(galaxy_git_root, "push", "-q", upstream, "release_23.0")
+    ensure_branches_up_to_date(branches, upstream, galaxy_git_root)
+    git(galaxy_git_root, "commit", "-q", "--allow-empty", "-m", "unpushed")
+    with pytest.raises(Exception, match=f"Local tip of branch {branches[0]} is"):
+        ensure_branches_up_to_date(branches, upstream, galaxy_git_root)
+    with pytest.raises(Exception, match="Branches missing locally: release_23.1\\."):
+        ensure_branches_up_to_date([*branches, "release_23.1"], upstream, galaxy_git_root)
+    missing_upstream = str(galaxy_git_root / "missing.git")
+    with pytest.raises(
+        Exception, match=f"Could not list branches {branches[0]}, release_23.0 of {missing_upstream}: .+"
+    ):
+        ensure_branches_up_to_date(branches, missing_upstream, galaxy_git_root)
+
+
+def test_get_branches(galaxy_git_root: pathlib.Path):
+    for branch in ["release_22.05", "release_23.0", "release_23.1", "release_24.0", "release_24.0_fix", "feature"]:
+        git(galaxy_git_root, "branch", branch)
+    assert get_branches(galaxy_git_root, Version("23.0.2"), "release_23.0") == ["release_23.1", "release_24.0", "dev"]
+    assert get_branches(galaxy_git_root, Version("24.0.1"), "dev") == []
+
+
+def test_stage_changes_and_commit(galaxy_git_root: pathlib.Path):
+    package = read_package(galaxy_git_root / "packages" / "app")
+    bump_package_version(package, Version("23.0.1"))
+    package.write_history()
+    modified_paths = [package.setup_cfg, *package.modified_paths]
+    stage_changes_and_commit(galaxy_git_root, Version("23.0.1"), modified_paths, "Create version 23.0.1", True)
+    assert git(galaxy_git_root, "log", "-1", "--format=%s") == "Create version 23.0.1"
+    assert git(galaxy_git_root, "status", "--porcelain") == ""
+    with pytest.raises(subprocess.CalledProcessError):
+        stage_changes_and_commit(galaxy_git_root, Version("23.0.1"), modified_paths, "Nothing to commit", True)
+
+
+def test_push_references(galaxy_git_root: pathlib.Path, tmp_path_factory):
+    upstream = str(tmp_path_factory.mktemp("upstream") / "galaxy.git")
+    git(galaxy_git_root, "init", "-q", "--bare", upstream)
+    branch = get_current_branch(galaxy_git_root)
+    push_references(galaxy_git_root, "v1", [branch], upstream, True)
+    remote_refs = git(galaxy_git_root, "ls-remote", "--heads", "--tags", upstream)
+    assert remote_refs.splitlines() == [
+        f"{git(galaxy_git_root, 'rev-parse', branch)}\trefs/heads/{branch}",
+        f"{git(galaxy_git_root, 'rev-parse', 'v1')}\trefs/tags/v1",
+    ]
+    # the branch can't be fast-forwarded, so the new tag must not be pushed either
+    git(galaxy_git_root, "reset", "-q", "--hard", "HEAD~1")
+    git(galaxy_git_root, "tag", "v2")
+    with pytest.raises(subprocess.CalledProcessError):
+        push_references(galaxy_git_root, "v2", [branch], upstream, True)
+    assert git(galaxy_git_root, "ls-remote", "--heads", "--tags", upstream) == remote_refs
+
+
+HISTORY_RST_WITH_SECTIONS = """History
+-------
+
+.. to_doc
+
+-------------------
+23.0.2 (2023-03-01)
+-------------------
+
+
+=========
+Bug fixes
+=========
+
+* Fix upload by `@jdoe <https://github.com/jdoe>`_ in `#2 <https://github.com/galaxyproject/galaxy/pull/2>`_
+
+============
+Enhancements
+============
+
+* Add thing by `@jdoe <https://github.com/jdoe>`_ in `#3 <https://github.com/galaxyproject/galaxy/pull/3>`_
+
+-------------------
+23.0.1 (2023-02-20)
+-------------------
+
+No recorded changes since last release
+"""
+
+
+def test_parse_changelog(tmp_path: pathlib.Path):
+    for name in ["first", "second"]:
+        package = Package(path=tmp_path / name, current_version="23.0.2")
+        write_contents(package.history_rst, HISTORY_RST_WITH_SECTIONS)
+        items = parse_changelog(package)
+        assert [(str(item.version), item.date) for item in items] == [
+            ("23.0.2", "2023-03-01"),
+            ("23.0.1", "2023-02-20"),
+        ]
+        assert items[0].changes == [
+            "\n=========\nBug fixes\n=========\n",
+            "* Fix upload by `@jdoe <https://github.com/jdoe>`_ in `#2 <https://github.com/galaxyproject/galaxy/pull/2>`_",
+            "\n============\nEnhancements\n============\n",
+            "* Add thing by `@jdoe <https://github.com/jdoe>`_ in `#3 <https://github.com/galaxyproject/galaxy/pull/3>`_",
+        ]
+        assert items[1].changes == ["No recorded changes since last release"]
+        assert [str(item.version) for item in package.release_items] == ["23.0.2", "23.0.1"]
+
+
+SETUP_CFG_CONTENTS = """[metadata]
+name = galaxy-app
+version = 23.0.1.dev0
+description = Galaxy app
+"""
+
+
+def test_read_and_bump_package_version(tmp_path: pathlib.Path):
+    package_path = tmp_path / "app"
+    write_contents(package_path / "setup.cfg", SETUP_CFG_CONTENTS)
+    (package_path / "HISTORY.rst").write_text(HISTORY_RST_CONTENTS)
+    package = read_package(package_path)
+    assert package.current_version == "23.0.1.dev0"
+    bump_package_version(package, Version("23.0.1"))
+    assert package.setup_cfg.read_text() == SETUP_CFG_CONTENTS.replace("23.0.1.dev0", "23.0.1")
+    assert package.modified_paths == [package.setup_cfg]
+    assert read_package(package_path).current_version == "23.0.1"
+    (package_path / "setup.cfg").write_text("[metadata]\nname = galaxy-app\n")
+    with pytest.raises(ValueError, match="does not contain version line"):
+        read_package(package_path)
+
+
+def test_changelog_round_trip(tmp_path: pathlib.Path):
+    package = Package(path=tmp_path / "app", current_version="23.0.2")
+    write_contents(package.history_rst, HISTORY_RST_WITH_SECTIONS)
+    package.package_history = parse_changelog(package)
+    assert str(package.package_history[1]) == (
+        "-------------------\n23.0.1 (2023-02-20)\n-------------------\n\nNo recorded changes since last release\n"
+    )
+    package.write_history()
+    assert package.history_rst.read_text() == HISTORY_RST_WITH_SECTIONS
+
+
+def history_rst(*entries: str) -> str:
+    sections = []
+    for entry in entries:
+        underline = "-" * len(entry)
+        sections.append(f"{underline}\n{entry}\n{underline}\n")
+        if "(" in entry:
+            sections[-1] += "\nFirst release\n" if entry.startswith("23.0.0 ") else "\n* Fix upload\n"
+    return point_release.HISTORY_TEMPLATE + "\n".join(sections)
+
+
+def write_release(galaxy_root: pathlib.Path, major: str, minor: str, package_version: str, history: str):
+    version_py = galaxy_root / "lib" / "galaxy" / "version.py"
+    version_py.write_text(VERSION_PY_CONTENTS.replace('"23.0"', f'"{major}"').replace('"2"', f'"{minor}"'))
+    package_path = galaxy_root / "packages" / "app"
+    (package_path / "setup.cfg").write_text(SETUP_CFG_CONTENTS.replace("23.0.1.dev0", package_version))
+    (package_path / "HISTORY.rst").write_text(history)
+    git(galaxy_root, "commit", "-q", "-am", f"version {package_version}")
+
+
+MERGED_HISTORY_RST = """History
+-------
+
+.. to_doc
+
+---------
+23.1.dev0
+---------
+
+
+
+-------------------
+23.0.1 (2023-03-01)
+-------------------
+
+* Fix upload
+
+-------------------
+23.0.0 (2023-02-20)
+-------------------
+
+First release
+"""
+
+
+def test_merge_and_resolve_branches(tmp_path: pathlib.Path):
+    git(tmp_path, "init", "-q", "-b", "release_23.0")
+    git(tmp_path, "config", "user.email", "test@example.org")
+    git(tmp_path, "config", "user.name", "Test")
+    write_contents(tmp_path / "packages" / "packages_by_dep_dag.txt", "app\n")
+    write_contents(tmp_path / "lib" / "galaxy" / "version.py", "")
+    write_contents(tmp_path / "packages" / "app" / "setup.cfg", "")
+    git(tmp_path, "add", ".")
+    write_release(tmp_path, "23.0", "0", "23.0.0", history_rst("23.0.0 (2023-02-20)"))
+    git(tmp_path, "checkout", "-q", "-b", "dev")
+    write_release(tmp_path, "23.1", "dev0", "23.1.0.dev0", history_rst("23.1.0.dev0", "23.0.0 (2023-02-20)"))
+    git(tmp_path, "checkout", "-q", "release_23.0")
+    write_release(tmp_path, "23.0", "1", "23.0.1", history_rst("23.0.1 (2023-03-01)", "23.0.0 (2023-02-20)"))
+    package = read_package(tmp_path / "packages" / "app")
+
+    merge_and_resolve_branches(tmp_path, "release_23.0", "dev", [package])
+
+    assert git(tmp_path, "status", "--porcelain") == ""
+    assert git(tmp_path, "rev-parse", "--abbrev-ref", "HEAD") == "dev"
+    assert str(get_root_version(tmp_path)) == "23.1.dev0"
+    assert read_package(package.path).current_version == "23.1.0.dev0"
+    assert package.history_rst.read_text() == MERGED_HISTORY_RST
@@ -0,0 +1,22 @@
+import click
+from click.testing import CliRunner
+
+from galaxy_release_util.bootstrap_history import cli as bootstrap_history_cli
+from galaxy_release_util.cli.release_util import cli
+from galaxy_release_util.point_release import cli as point_release_cli
+
+
+def test_commands():
+    ctx = click.Context(cli)
+    expected = sorted([*bootstrap_history_cli.commands, *point_release_cli.commands])
+    assert cli.list_commands(ctx) == expected
+    for name in expected:
+        assert cli.get_command(ctx, name) is not None
+    assert cli.get_command(ctx, "not-a-command") is None
+
+
+def test_help():
+    result = CliRunner().invoke(cli, ["--help"])
+    assert result.exit_code == 0, result.output
+    assert "create-changelog" in result.output
+    assert "build-and-upload" in result.output